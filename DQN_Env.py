@@ -1,20 +1,20 @@
-import random
-import sys
 import numpy as np
 
 import minesweeper
-# Raise recursion limit to avoid RecursionError on bigger boards
-sys.setrecursionlimit(2**16)
 
 
 class DQEnvironment(object):
-    def __init__(self, bomb_count, board_size):
+    def __init__(self, bomb_count, board_size, rng=None):
         self.board_size = board_size
         self.bomb_count = bomb_count
-        first_r = random.randint(1, board_size - 1)
-        first_c = random.randint(1, board_size - 1)
-        self.board = np.zeros((board_size, board_size))
-        self.board_state = np.zeros((board_size, board_size))
+        # numpy Generator, or a seed for one, that every board is drawn from
+        self.rng = np.random.default_rng(rng)
+        self.board = np.zeros((board_size, board_size), dtype=minesweeper.board_dtype)
+        self.counts = minesweeper.init_counts(self.board)
+        self.regions = None
+        self.board_state = np.zeros(
+            (board_size, board_size), dtype=minesweeper.board_state_dtype
+        )
         self.rewards = {
             "win": 1,
             "lose": -0.5,
@@ -63,7 +63,12 @@ class DQEnvironment(object):
         action_row = action // self.board_size
         action_col = action % self.board_size
         new_board_state = minesweeper.open_tile(
-            old_board_state, self.board, action_row, action_col
+            old_board_state,
+            self.board,
+            action_row,
+            action_col,
+            self.counts,
+            self.regions,
         )
         self.board_state = new_board_state
         guessed = self.is_guess(action_row, action_col, old_board_state)
@@ -98,11 +103,18 @@ class DQEnvironment(object):
         return self.board_state, reward, done
 
     def reset(self):
-        first_r = random.randint(1, self.board_size - 1)
-        first_c = random.randint(1, self.board_size - 1)
+        first_r = self.rng.integers(1, self.board_size)
+        first_c = self.rng.integers(1, self.board_size)
         self.board = minesweeper.init_board(
-            self.board_size, self.bomb_count, first_r, first_c
+            self.board_size, self.bomb_count, first_r, first_c, self.rng
         )
+        self.counts = minesweeper.init_counts(self.board)
+        self.regions = minesweeper.init_regions(self.board, self.counts)
         self.board_state = minesweeper.open_tile(
-            minesweeper.init_board_state(self.board_size), self.board, first_r, first_c
+            minesweeper.init_board_state(self.board_size),
+            self.board,
+            first_r,
+            first_c,
+            self.counts,
+            self.regions,
         )
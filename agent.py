@@ -81,7 +81,7 @@ def select_action(state):
     steps_done += 1
     if sample > eps_threshold:
         with torch.no_grad():
-            return policy_net(state).max(1)[1].view(1, 1)
+            return policy_net(state.float()).max(1)[1].view(1, 1)
     else:
         rand_list = []
         for r in range(env.board_size):
@@ -125,8 +125,8 @@ def optimize_model():
     non_final_mask = torch.tensor(tuple(map(lambda s: s is not None,
                                           batch.next_state)), device=device, dtype=torch.bool)
     non_final_next_states = torch.cat([s for s in batch.next_state
-                                                if s is not None])
-    state_batch = torch.cat(batch.state)
+                                                if s is not None]).float()
+    state_batch = torch.cat(batch.state).float()
     action_batch = torch.cat(batch.action)
     reward_batch = torch.cat(batch.reward)
     state_action_values = policy_net(state_batch).gather(1, action_batch)
@@ -155,7 +155,8 @@ for i_episode in range(num_episodes):
   
     env.reset()
     state = env.board_state.flatten('C')
-    state = torch.tensor(state, dtype=torch.float32, device=device).unsqueeze(0)
+    # states are kept as int8 board states, and only cast to float for the networks
+    state = torch.tensor(state, dtype=torch.int8, device=device).unsqueeze(0)
     for t in count():
         action = select_action(state)
         board_state, reward, done = env.step(action.item())
@@ -165,7 +166,7 @@ for i_episode in range(num_episodes):
         if done:
             next_state = None
         else:
-            next_state = torch.tensor(board_state, dtype=torch.float32, device=device).unsqueeze(0)
+            next_state = torch.tensor(board_state, dtype=torch.int8, device=device).unsqueeze(0)
 
         memory.push(state, action, next_state, reward)
         state = next_state
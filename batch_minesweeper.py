@@ -0,0 +1,161 @@
+import numpy as np
+import minesweeper
+from minesweeper import mine, unopened, flaged, coordinates
+from minesweeper import board_dtype, board_state_dtype
+
+"""A batch of [game_count] games of minesweeper played side by side. The boards and board
+states of every game are stored as (game_count, size, size) arrays, and each open or
+flag step takes one tile per game and applies all of them at once. Games that are won
+or lost are masked out of every later step."""
+
+
+class BatchGame(object):
+    def __init__(self, game_count, board_size, bomb_count, rng=None):
+        self.game_count = game_count
+        self.board_size = board_size
+        self.bomb_count = bomb_count
+        self.rng = np.random.default_rng(rng)
+        shape = (game_count, board_size, board_size)
+        self.boards = np.zeros(shape, dtype=board_dtype)
+        self.counts = np.zeros(shape, dtype=np.int8)
+        self.labels = np.full(shape, -1, dtype=np.int32)
+        self.board_states = np.full(shape, unopened, dtype=board_state_dtype)
+        self.first_move = np.ones(game_count, dtype=bool)
+        self.safe_opened = np.zeros(game_count, dtype=np.int64)
+        self.mines_opened = np.zeros(game_count, dtype=np.int64)
+        self.flags = np.zeros(game_count, dtype=np.int64)
+        self.move_counts = np.zeros(game_count, dtype=np.int64)
+
+    """place the mines of the games in [games], which have not been started yet, so that
+    none of them lands on the first tile (rows, cols) of its game."""
+
+    def start(self, games, rows, cols):
+        tile_count = self.board_size**2
+        first_tile = rows * self.board_size + cols
+        # the bomb_count smallest random keys are the mines, and the first tile gets a
+        # key no other tile can have so it is never picked
+        keys = self.rng.random((len(games), tile_count))
+        keys[np.arange(len(games)), first_tile] = 2
+        bombs = np.argpartition(keys, self.bomb_count - 1, axis=1)[:, : self.bomb_count]
+        boards = np.zeros((len(games), tile_count), dtype=board_dtype)
+        np.put_along_axis(boards, bombs, mine, axis=1)
+        boards = boards.reshape(len(games), self.board_size, self.board_size)
+        self.boards[games] = boards
+        self.counts[games] = minesweeper.init_counts(boards)
+        self.labels[games] = minesweeper.label_zero_tiles(
+            (self.counts[games] == 0) & (boards != mine)
+        )
+        self.first_move[games] = False
+
+    """open the tile (rows[i], cols[i]) in game i for every game that is still being
+    played and is selected by [active], which defaults to all of them."""
+
+    def open(self, rows, cols, active=None):
+        games = self.playing(active)
+        rows, cols = np.asarray(rows)[games], np.asarray(cols)[games]
+        self.move_counts[games] += 1
+        starting = self.first_move[games]
+        if np.any(starting):
+            self.start(games[starting], rows[starting], cols[starting])
+
+        tile_state = self.board_states[games, rows, cols]
+        keep = tile_state != flaged
+        games, rows, cols = games[keep], rows[keep], cols[keep]
+        newly_opened = tile_state[keep] == unopened
+
+        self.board_states[games, rows, cols] = self.counts[games, rows, cols]
+        hit = self.boards[games, rows, cols] == mine
+        self.mines_opened[games[hit & newly_opened]] += 1
+        self.safe_opened[games[~hit & newly_opened]] += 1
+
+        cascade = ~hit & (self.counts[games, rows, cols] == 0)
+        games, rows, cols = games[cascade], rows[cascade], cols[cascade]
+        if len(games):
+            self.reveal_regions(games, rows, cols)
+
+    """reveal the zero region under (rows[i], cols[i]) in game games[i] together with its
+    numbered border, by growing the region mask by one tile in every direction."""
+
+    def reveal_regions(self, games, rows, cols):
+        labels = self.labels[games]
+        region = labels == labels[np.arange(len(games)), rows, cols][:, None, None]
+        board_states = self.board_states[games]
+
+        # a flagged zero tile stops the cascade, those games walk their region one by one
+        blocked = np.any(region & (board_states == flaged), axis=(1, 2))
+        for g, r, c in zip(games[blocked], rows[blocked], cols[blocked]):
+            self.safe_opened[g] += minesweeper.reveal_tile(
+                self.board_states[g], self.boards[g], r, c, self.counts[g]
+            )
+        games, region = games[~blocked], region[~blocked]
+        board_states = board_states[~blocked]
+
+        padded = np.pad(region, [(0, 0), (1, 1), (1, 1)])
+        size = self.board_size
+        border = region.copy()
+        for r, c in coordinates:
+            border |= padded[:, 1 + r : 1 + r + size, 1 + c : 1 + c + size]
+        hidden = border & (board_states == unopened)
+        board_states[hidden] = self.counts[games][hidden]
+        self.board_states[games] = board_states
+        self.safe_opened[games] += np.count_nonzero(hidden, axis=(1, 2))
+
+    """flag or unflag the tile (rows[i], cols[i]) in game i for every game that is still
+    being played and is selected by [active], which defaults to all of them."""
+
+    def flag(self, rows, cols, active=None):
+        games = self.playing(active)
+        rows, cols = np.asarray(rows)[games], np.asarray(cols)[games]
+        self.move_counts[games] += 1
+        tile_state = self.board_states[games, rows, cols]
+        flagging = tile_state == unopened
+        unflagging = tile_state == flaged
+        self.board_states[games[flagging], rows[flagging], cols[flagging]] = flaged
+        self.board_states[games[unflagging], rows[unflagging], cols[unflagging]] = (
+            unopened
+        )
+        self.flags[games[flagging]] += 1
+        self.flags[games[unflagging]] -= 1
+
+    """choose a random unopened tile in every game, returned as arrays (rows, cols)."""
+
+    def random_moves(self):
+        keys = np.where(
+            self.board_states == unopened,
+            self.rng.random(self.board_states.shape),
+            -1,
+        )
+        tiles = np.argmax(keys.reshape(self.game_count, -1), axis=1)
+        return np.divmod(tiles, self.board_size)
+
+    """the indices of the games that are neither won nor lost, limited to [active] when
+    it is given as a boolean mask over the games."""
+
+    def playing(self, active=None):
+        playing = ~self.done()
+        if active is not None:
+            playing &= active
+        return np.flatnonzero(playing)
+
+    def lost(self):
+        return self.mines_opened > 0
+
+    def won(self):
+        return (self.mines_opened == 0) & (
+            self.safe_opened == self.board_size**2 - self.bomb_count
+        )
+
+    def done(self):
+        return self.lost() | self.won()
+
+
+"""play [game_count] games that only open random unopened tiles, and return the number
+of games won. Gives a baseline win rate for a board configuration."""
+
+
+def random_win_count(game_count, board_size, bomb_count, rng=None):
+    games = BatchGame(game_count, board_size, bomb_count, rng)
+    while not np.all(games.done()):
+        rows, cols = games.random_moves()
+        games.open(rows, cols)
+    return int(np.count_nonzero(games.won()))
@@ -0,0 +1,206 @@
+import argparse
+import copy
+import json
+import platform
+import time
+import numpy as np
+
+import heuristic_model
+import minesweeper
+import DQN_Env
+
+# board size and mine count of the difficulties suggested in the README
+presets = {
+    "beginner": (9, 10),
+    "intermediate": (16, 40),
+    "expert": (22, 99),
+}
+
+# every board a benchmark runs on is drawn from this seed, so runs compare the same work
+seed = 0
+
+"""play a few seeded SP games with local probability guesses and return the longest one
+stopped halfway through, which gives a board with both opened regions and a frontier to
+solve. Returns the game, which holds the board with its counts and regions, and the
+board state halfway through."""
+
+
+def snapshot(board_size, bomb_count, games=10):
+    class StateRecorder(minesweeper.GameObserver):
+        def __init__(self):
+            self.game = None
+            self.board_states = []
+
+        def on_move(self, game, opp, r, c, move_count):
+            self.game = game
+            self.board_states.append(game.board_state.copy())
+
+    longest = None
+    for game in range(games):
+        recorder = StateRecorder()
+        minesweeper.game_loop(
+            "ai",
+            bomb_count,
+            board_size,
+            0,
+            1,
+            [recorder],
+            rng=minesweeper.game_seed(seed, game),
+        )
+        if longest is None or len(recorder.board_states) > len(longest.board_states):
+            longest = recorder
+    return longest.game, longest.board_states[len(longest.board_states) // 2]
+
+
+def reset_knowledge_base():
+    heuristic_model.queue.clear()
+    heuristic_model.mines.clear()
+    heuristic_model.empty.clear()
+    heuristic_model.component_cache.clear()
+    heuristic_model.pattern_table.clear()
+
+
+"""time [call] on the argument returned by [setup], which is not timed. Calls are repeated
+until [min_time] seconds have been spent, and the fastest call is returned in seconds."""
+
+
+def time_call(call, setup, min_time=0.2, max_calls=1000):
+    best = float("inf")
+    spent = 0
+    calls = 0
+    while calls < max_calls and (spent < min_time or calls < 3):
+        argument = setup()
+        start = time.perf_counter()
+        call(argument)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        spent += elapsed
+        calls += 1
+    return best
+
+
+"""time the engine and solver hot paths on every preset. Returns a dictionary from
+"preset/benchmark" to the fastest time of one call in seconds."""
+
+
+def run_benchmarks(min_time=0.2):
+    results = {}
+    for name, (board_size, bomb_count) in presets.items():
+        game, board_state = snapshot(board_size, bomb_count)
+        board, counts, regions = game.board, game.counts, game.regions
+        first_tile = tuple(np.argwhere((counts == 0) & (board != minesweeper.mine))[0])
+
+        def solver_setup():
+            reset_knowledge_base()
+            return board_state.copy()
+
+        # flagging a frontier tile, which only changes the constraints around it
+        constraint_state = heuristic_model.ConstraintState()
+        constraint_state.update(board_state)
+        frontier_tile = min(constraint_state.tile_constraints)
+        flagged_state = board_state.copy()
+        flagged_state[frontier_tile] = minesweeper.flaged
+
+        def constraint_setup():
+            return copy.deepcopy(constraint_state)
+
+        env = DQN_Env.DQEnvironment(bomb_count, board_size, rng=seed)
+        env.reset()
+        env_state = env.board_state.copy()
+        action = int(
+            np.flatnonzero((env_state == -1).ravel() & (env.board.ravel() == 0))[0]
+        )
+
+        def env_setup():
+            env.board_state = env_state.copy()
+            return action
+
+        benchmarks = {
+            "open_tile": (
+                lambda state: minesweeper.open_tile(
+                    state, board, first_tile[0], first_tile[1], counts, regions
+                ),
+                lambda: minesweeper.init_board_state(board_size),
+            ),
+            "game_won": (
+                lambda state: minesweeper.game_won(state, bomb_count),
+                lambda: board_state,
+            ),
+            "game_lost": (
+                lambda state: minesweeper.game_lost(board, state),
+                lambda: board_state,
+            ),
+            "to_matrix": (heuristic_model.to_matrix, lambda: board_state),
+            "ConstraintState.update": (
+                lambda state: state.update(flagged_state, [frontier_tile]),
+                constraint_setup,
+            ),
+            "SP_solver": (heuristic_model.SP_solver, solver_setup),
+            "pattern_solver": (heuristic_model.pattern_solver, solver_setup),
+            "CSP_solver": (heuristic_model.CSP_solver, solver_setup),
+            "select_tile_with_lowest_local_probability": (
+                lambda state: heuristic_model.select_tile_with_lowest_local_probability(
+                    state, bomb_count, np.random.default_rng(seed)
+                ),
+                lambda: board_state,
+            ),
+            "DQEnvironment.step": (env.step, env_setup),
+        }
+        for benchmark, (call, setup) in benchmarks.items():
+            results[name + "/" + benchmark] = time_call(call, setup, min_time)
+    reset_knowledge_base()
+    return results
+
+
+"""the benchmarks of [results] that are more than [tolerance] times slower than in
+[baseline], as a dictionary from benchmark to (baseline time, new time)."""
+
+
+def find_regressions(results, baseline, tolerance=1.5):
+    return {
+        benchmark: (baseline[benchmark], seconds)
+        for benchmark, seconds in results.items()
+        if benchmark in baseline and seconds > baseline[benchmark] * tolerance
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the minesweeper engine and solver hot paths."
+    )
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="compare the results to a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.min_time)
+    for benchmark, seconds in results.items():
+        print(f"{benchmark:60} {seconds * 1e6:14.1f} us")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for benchmark, (before, after) in regressions.items():
+            print(
+                f"regression {benchmark}: {before * 1e6:.1f} us -> {after * 1e6:.1f} us"
+            )
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,10 @@
-from sympy import *
+import math
+import json
+import os
+import threading
+import time
 import numpy as np
-from collections import deque
-
-# represents the knowledge base of the AI, so that moves are not duplicated
-mines = set()
-empty = set()
-
-# store moves as a tripple - (opp, r, c) - where opp is "flag" or "mine" and
-# and r and c represent coordinates row and columns respectively
-queue = deque()
+from collections import OrderedDict, deque
 
 # the change in tile for each of the 8 surrounding tiles
 
@@ -52,168 +48,776 @@ def to_matrix(board_state):
     return board_rep
 
 
+"""given a board state, create the constraint system of its frontier only. There is one
+row for each opened tile with a postive surrounding mine count and at least one unopened
+neighbor, and one column for each unopened tile next to such a tile, followed by a final
+column holding the surrounding mine count less the flagged neighbors. Returns a tuple -
+(board_rep, tiles) - where tiles[i] is the (row, col) of the tile of column i. Rows and
+columns keep the order of to_matrix with its empty rows and columns left out, so the
+system has no more entries than the frontier has. The solvers do not call it: they keep
+the same system up to date move by move with ConstraintState, and this whole-board
+builder is the reference the tests check ConstraintState.matrix against."""
+
+
+def frontier_constraints(board_state):
+    board_state = np.asarray(board_state)
+    row_size, col_size = board_state.shape
+    numbered_r, numbered_c = np.nonzero(board_state > 0)
+    remaining = board_state[numbered_r, numbered_c].astype(np.int64)
+
+    # one (constraint, tile) entry for every unopened neighbor of a numbered tile
+    entry_rows = []
+    entry_tiles = []
+    for i, j in coordinates:
+        r, c = numbered_r + i, numbered_c + j
+        inside = (r >= 0) & (c >= 0) & (r < row_size) & (c < col_size)
+        neighbor = np.full(len(r), 0, dtype=board_state.dtype)
+        neighbor[inside] = board_state[r[inside], c[inside]]
+        remaining -= inside & (neighbor == -2)
+        hidden = inside & (neighbor == -1)
+        entry_rows.append(np.flatnonzero(hidden))
+        entry_tiles.append(r[hidden] * col_size + c[hidden])
+    entry_rows = np.concatenate(entry_rows)
+    entry_tiles = np.concatenate(entry_tiles)
+
+    constraint_rows, row_index = np.unique(entry_rows, return_inverse=True)
+    frontier_tiles, col_index = np.unique(entry_tiles, return_inverse=True)
+    board_rep = np.zeros((len(constraint_rows), len(frontier_tiles) + 1))
+    board_rep[row_index, col_index] = 1
+    board_rep[:, -1] = remaining[constraint_rows]
+    tiles = np.stack(np.divmod(frontier_tiles, col_size), axis=1)
+    return board_rep, tiles
+
+
 """For the row reduced version of the matrix representation of board_state,
 analyze each row to see if any certain moves can be made. A row is analyzed
 by seeing if the final column index is equal to the maximum or minimum of this equation.
 If it is equal to the maximum, positive tiles are mines and negative tiles are empty.
 If it is equal to the minimum, postive tiles are empty and negative tiles are mines.
 The given information should be added to queue, which represents certain moves. Additionally, 
-the AI knowledge base (the sets mines and empty) should be updated."""
+the AI knowledge base (the sets mines and empty) should be updated. [tiles] maps each
+column to its (row, col) for a matrix of frontier_constraints, and defaults to the
+tile order of to_matrix. Returns every move the matrix gives, known or not. The queue
+and knowledge base are those of [solver], default_solver when it is not given."""
 
 
-def analyze_matrix(board_rep, board_state):
-    tile_count = len(board_state) * len(board_state[0])
-    for r in range(tile_count):
-        maximum = 0
-        minimum = 0
-        for c in range(tile_count):
-            if board_rep[r, c] > 0:
-                maximum += board_rep[r, c]
+def analyze_matrix(board_rep, board_state, tiles=None, solver=None):
+    board_rep = np.asarray(board_rep, dtype=float)
+    tile_count = board_rep.shape[1] - 1
+    if tiles is None:
+        tiles = [divmod(c, len(board_state[0])) for c in range(tile_count)]
+    coefficients, values = board_rep[:, :tile_count], board_rep[:, tile_count]
+    maximum = np.sum(np.where(coefficients > 0, coefficients, 0), axis=1)
+    minimum = np.sum(np.where(coefficients < 0, coefficients, 0), axis=1)
+    moves = []
+    for r in np.flatnonzero((maximum == values) | (minimum == values)):
+        # at the maximum the positive tiles are mines, at the minimum the negative ones
+        mine_sign = 1 if maximum[r] == values[r] else -1
+        for c in np.flatnonzero(coefficients[r]):
+            i, j = int(tiles[c][0]), int(tiles[c][1])
+            if coefficients[r, c] * mine_sign > 0:
+                moves.append(("flag", i, j))
             else:
-                minimum += board_rep[r, c]
-        if maximum == board_rep[r, tile_count]:
-            for c in range(tile_count):
-                i, j = c // len(board_state), c % len(board_state)
-                if board_rep[r, c] > 0:
-                    if (i, j) not in mines:
-                        queue.append(("flag", i, j))
-                        mines.add((i, j))
-                elif board_rep[r, c] < 0:
-                    if (i, j) not in empty:
-                        queue.append(("open", i, j))
-                        empty.add((i, j))
-        elif minimum == board_rep[r, tile_count]:
-            for c in range(tile_count):
-                i, j = c // len(board_state), c % len(board_state)
-                if board_rep[r, c] > 0:
-                    if (i, j) not in empty:
-                        queue.append(("open", i, j))
-                        empty.add((i, j))
-                elif board_rep[r, c] < 0 and (i, j) not in mines:
-                    queue.append(("flag", i, j))
-                    mines.add((i, j))
-
-
-"""Given a board_state, run the CSP solver"""
-
-
-def CSP_solver(board_state):
-    # create a matrix representation of the board_state
-    board_rep = to_matrix(board_state)
-
-    # row reduce the board representation
-    board_rep = Matrix(board_rep)
-    board_rep.rref()
-
-    # determine flag and move operations from the row reduced board representation
-    analyze_matrix(board_rep, board_state)
+                moves.append(("open", i, j))
+    queue_moves(moves, solver)
+    return moves
+
+
+"""add the (opp, r, c) moves of [moves] that the knowledge base of [solver] does not
+hold yet to its queue, and the tiles they are about to its mines or empty."""
+
+
+def queue_moves(moves, solver=None):
+    if solver is None:
+        solver = default_solver
+    for opp, i, j in moves:
+        known = solver.mines if opp == "flag" else solver.empty
+        if (i, j) not in known:
+            solver.queue.append((opp, i, j))
+            known.add((i, j))
+
+
+"""row reduce an integer matrix exactly, without leaving the integers. Each pivot step
+scales the other rows by the pivot instead of dividing the pivot row by it, and every
+changed row is divided by the gcd of its entries so the entries stay small. Returns the
+reduced matrix, where every pivot column has a single nonzero entry and each row is a
+postive multiple of the row the rational row reduction gives."""
+
+
+def rref(board_rep):
+    board_rep = np.array(board_rep, dtype=np.int64)
+    row_count, col_count = board_rep.shape
+    pivot_row = 0
+    for c in range(col_count - 1):
+        if pivot_row == row_count:
+            break
+        candidates = np.flatnonzero(board_rep[pivot_row:, c])
+        if not len(candidates):
+            continue
+        swap = pivot_row + candidates[0]
+        board_rep[[pivot_row, swap]] = board_rep[[swap, pivot_row]]
+        if board_rep[pivot_row, c] < 0:
+            board_rep[pivot_row] *= -1
+        pivot = board_rep[pivot_row]
+        others = np.flatnonzero(board_rep[:, c])
+        others = others[others != pivot_row]
+        if len(others):
+            scale = board_rep[others, c]
+            reduced = pivot[c] * board_rep[others] - np.outer(scale, pivot)
+            divisor = np.gcd.reduce(reduced, axis=1)
+            divisor[divisor == 0] = 1
+            board_rep[others] = reduced // divisor[:, None]
+        pivot_row += 1
+    return board_rep
+
+
+"""The frontier constraints of a board state, kept up to date from the tiles that changed
+since the last update instead of being rebuilt from the whole board. Every numbered tile
+with unopened neighbors has a constraint - (unknown, remaining) - holding the set of those
+neighbors and its mine count less its flagged neighbors. A changed tile can only affect
+the constraints of the numbered tiles around it and of itself, so only those are added,
+shrunk or retired. dirty holds the constraints changed since the last solve."""
+
+
+class ConstraintState(object):
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.board_state = None
+        self.constraints = {}
+        self.tile_constraints = {}
+        self.dirty = set()
+
+    """bring the constraints up to date with [board_state]. [changed] lists the tiles that
+    changed since the last update, so only they and their neighbors are looked at. When it
+    is not given the changed tiles are found by comparing with the last board state seen,
+    which is one pass over the board."""
+
+    def update(self, board_state, changed=None):
+        board_state = np.asarray(board_state)
+        if self.board_state is None or self.board_state.shape != board_state.shape:
+            self.clear()
+            self.board_state = np.full(board_state.shape, -1, dtype=board_state.dtype)
+        row_size, col_size = board_state.shape
+        if changed is None:
+            changed = board_state != self.board_state
+            if not changed.any():
+                return
+            self.board_state[changed] = board_state[changed]
+
+            # the changed tiles and their neighbors, of which only the numbered tiles
+            # and the tiles that had a constraint need to be rebuilt
+            padded = np.pad(changed, 1)
+            affected = changed.copy()
+            for i, j in coordinates:
+                affected |= padded[1 + i : 1 + i + row_size, 1 + j : 1 + j + col_size]
+            tiles = set(zip(*np.nonzero(affected & (self.board_state > 0))))
+            tiles.update(tile for tile in self.constraints if affected[tile])
+        else:
+            tiles = set()
+            for r, c in changed:
+                r, c = int(r), int(c)
+                self.board_state[r, c] = board_state[r, c]
+                tiles.add((r, c))
+                for i, j in coordinates:
+                    if 0 <= r + i < row_size and 0 <= c + j < col_size:
+                        tiles.add((r + i, c + j))
+            tiles = [
+                tile
+                for tile in tiles
+                if self.board_state[tile] > 0 or tile in self.constraints
+            ]
+        for r, c in tiles:
+            self.rebuild(int(r), int(c))
+
+    """recompute the constraint of the tile ([r], [c]) from the last board state seen."""
+
+    def rebuild(self, r, c):
+        board = self.board_state
+        row_size, col_size = board.shape
+        tile = (r, c)
+        unknown = set()
+        remaining = int(board[r, c])
+        if remaining > 0:
+            for i, j in coordinates:
+                if 0 <= r + i < row_size and 0 <= c + j < col_size:
+                    neighbor = board[r + i, c + j]
+                    if neighbor == -1:
+                        unknown.add((r + i, c + j))
+                    elif neighbor == -2:
+                        remaining -= 1
+        old = self.constraints.pop(tile, None)
+        if old is not None:
+            for neighbor in old[0] - unknown:
+                self.tile_constraints[neighbor].discard(tile)
+                if not self.tile_constraints[neighbor]:
+                    del self.tile_constraints[neighbor]
+        if unknown:
+            self.constraints[tile] = (unknown, remaining)
+            for neighbor in unknown:
+                self.tile_constraints.setdefault(neighbor, set()).add(tile)
+        if old != self.constraints.get(tile):
+            self.dirty.add(tile)
+
+    """the constraint system in the form of frontier_constraints, limited to the
+    constraints of the numbered tiles in [rows] when it is given."""
+
+    def matrix(self, rows=None):
+        if rows is None:
+            rows = sorted(self.constraints)
+            tiles = sorted(self.tile_constraints)
+        else:
+            tiles = sorted(set().union(*(self.constraints[tile][0] for tile in rows)))
+        col_index = {tile: i for i, tile in enumerate(tiles)}
+        entry_rows = []
+        entry_cols = []
+        for i, tile in enumerate(rows):
+            unknown = self.constraints[tile][0]
+            entry_rows.extend([i] * len(unknown))
+            entry_cols.extend(col_index[neighbor] for neighbor in unknown)
+        board_rep = np.zeros((len(rows), len(tiles) + 1))
+        board_rep[entry_rows, entry_cols] = 1
+        board_rep[:, -1] = [self.constraints[tile][1] for tile in rows]
+        return board_rep, np.array(tiles, dtype=np.int64).reshape(-1, 2)
+
+    """split the frontier into its connected components, where two constraints are
+    connected when they share an unknown tile. Constraints of different components share
+    no unknowns, so each component can be solved on its own. Returns a list of the sorted
+    numbered tiles of each component, limited to the components holding one of the
+    numbered tiles in [tiles] when it is given."""
+
+    def components(self, tiles=None):
+        if tiles is None:
+            tiles = self.constraints
+        seen = set()
+        components = []
+        for start in sorted(tiles):
+            if start in seen or start not in self.constraints:
+                continue
+            seen.add(start)
+            stack = [start]
+            component = []
+            while stack:
+                tile = stack.pop()
+                component.append(tile)
+                for neighbor in self.constraints[tile][0]:
+                    for other in self.tile_constraints[neighbor]:
+                        if other not in seen:
+                            seen.add(other)
+                            stack.append(other)
+            components.append(sorted(component))
+        return components
+
+    """a hashable key of the constraints of the numbered tiles in [rows]. The moves a set
+    of constraints gives only depend on its unknown tiles and their mine counts, so the
+    key holds those and not the numbered tiles."""
+
+    def key(self, rows):
+        return tuple(
+            sorted(
+                (tuple(sorted(self.constraints[tile][0])), self.constraints[tile][1])
+                for tile in rows
+            )
+        )
+
+
+# the 8 rotations and reflections of the board, as the matrices they multiply a
+# (row, col) tile by
+component_symmetries = [
+    ((1, 0), (0, 1)),
+    ((0, 1), (-1, 0)),
+    ((-1, 0), (0, -1)),
+    ((0, -1), (1, 0)),
+    ((1, 0), (0, -1)),
+    ((-1, 0), (0, 1)),
+    ((0, 1), (1, 0)),
+    ((0, -1), (-1, 0)),
+]
+
+"""the canonical form of [key], the key of a frontier component: of its images under the
+8 rotations and reflections, each moved so its smallest row and column are 0, the
+smallest one. Only the images whose sorted tiles are smallest are built in full, as the
+tiles of every image are compared at once first. Returns the canonical key, and a
+function mapping a tile of the component to the canonical key and one mapping it back."""
+
+
+def canonical_component(key):
+    tiles = np.array(sorted(set().union(*(unknown for unknown, remaining in key))))
+    moved = np.einsum("nj,sij->sni", tiles, np.array(component_symmetries))
+    offsets = moved.min(axis=1)
+    moved -= offsets[:, None, :]
+    codes = np.sort(moved[:, :, 0] * (moved.max() + 1) + moved[:, :, 1], axis=1)
+    candidates = np.arange(len(component_symmetries))
+    for column in codes.T:
+        candidates = candidates[column[candidates] == column[candidates].min()]
+        if len(candidates) == 1:
+            break
+
+    best = None
+    for s in candidates.tolist():
+        (a, b), (d, e) = component_symmetries[s]
+        row, col = offsets[s].tolist()
+        image = []
+        for unknown, remaining in key:
+            unknown = sorted(
+                (a * r + b * c - row, d * r + e * c - col) for r, c in unknown
+            )
+            image.append((tuple(unknown), remaining))
+        image = tuple(sorted(image))
+        if best is None or image < best[0]:
+            best = (image, (a, b, d, e, row, col))
+    image, (a, b, d, e, row, col) = best
+
+    def forward(tile):
+        r, c = tile
+        return (a * r + b * c - row, d * r + e * c - col)
+
+    # the matrices are orthogonal, so their transpose undoes them
+    def back(tile):
+        r, c = tile[0] + row, tile[1] + col
+        return (a * r + d * c, b * r + e * c)
+
+    return image, forward, back
+
+
+"""the result of [kind] for a component, with every tile moved by [mapping]. "moves" is
+a list of (opp, r, c) moves, and "probabilities" the (tiles, counts) of
+enumerate_component, whose tiles are sorted again."""
+
+
+def map_result(kind, value, mapping):
+    if kind == "moves":
+        return [(opp,) + mapping((r, c)) for opp, r, c in value]
+    tiles, counts = value
+    tiles = [mapping(tile) for tile in tiles]
+    order = sorted(range(len(tiles)), key=tiles.__getitem__)
+    counts = {
+        k: [assignments, [tile_mines[i] for i in order]]
+        for k, (assignments, tile_mines) in counts.items()
+    }
+    return [tiles[i] for i in order], counts
+
+
+"""The results of the solvers for every frontier component seen so far, under the
+canonical form of its key, so a component is solved once for every rotation, reflection
+and translation of it. Each component keeps the results of every [kind] asked for, and
+once [size] results are held the least recently used one is dropped. The results can be
+saved to a file and loaded back to warm start a later run. The entries are only touched
+while holding a lock, so solvers playing games on different threads can share a cache."""
+
+
+class SolverCache(object):
+    def __init__(self, size=100000):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    """the result of [kind] for the component with key [key], or None if it has not been
+    stored."""
+
+    def get(self, key, kind):
+        image, forward, back = canonical_component(key)
+        with self.lock:
+            value = self.entries.get((kind, image))
+            if value is None:
+                return None
+            self.entries.move_to_end((kind, image))
+        return map_result(kind, value, back)
+
+    """store [value], the result of [kind] for the component with key [key]."""
+
+    def put(self, key, kind, value):
+        image, forward, back = canonical_component(key)
+        value = map_result(kind, value, forward)
+        with self.lock:
+            self.entries[(kind, image)] = value
+            self.entries.move_to_end((kind, image))
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    """write the results to the JSON file [path], least recently used first."""
+
+    def save(self, path):
+        with self.lock:
+            items = list(self.entries.items())
+        entries = []
+        for (kind, image), value in items:
+            if kind == "probabilities":
+                value = [value[0], list(value[1].items())]
+            entries.append([kind, image, value])
+        # write a temporary file first, so an interrupted save keeps the last cache
+        with open(path + ".tmp", "w") as f:
+            json.dump(entries, f)
+        os.replace(path + ".tmp", path)
+
+    """add the results saved at [path] to the cache, if there is a file there."""
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            entries = json.load(f)
+        loaded = []
+        for kind, image, value in entries:
+            image = tuple(
+                (tuple(tuple(tile) for tile in unknown), remaining)
+                for unknown, remaining in image
+            )
+            if kind == "moves":
+                value = [tuple(move) for move in value]
+            else:
+                value = (
+                    [tuple(tile) for tile in value[0]],
+                    {k: counts for k, counts in value[1]},
+                )
+            loaded.append(((kind, image), value))
+        with self.lock:
+            for entry, value in loaded:
+                self.entries[entry] = value
+                self.entries.move_to_end(entry)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+# the moves and mine assignments of every frontier component solved so far
+component_cache = SolverCache()
+
+"""Given a board_state, run the CSP solver on the constraints of its frontier. The
+frontier is split into its components, and each one is row reduced on its own. With a
+[constraint_state] the constraints are brought up to date from the tiles that changed
+instead of being rebuilt, and components without a changed constraint are skipped, as
+they have given all their moves already. The moves of each solved component are kept in
+component_cache, so a component seen before, in any position or orientation, is not
+solved again. Moves go to the queue of [solver], default_solver when it is not given."""
+
+
+def CSP_solver(board_state, constraint_state=None, solver=None):
+    # create the frontier constraints of board_state
+    if constraint_state is None:
+        constraint_state = ConstraintState()
+    constraint_state.update(board_state)
+    dirty = constraint_state.dirty
+
+    for component in constraint_state.components(dirty):
+        key = constraint_state.key(component)
+        moves = component_cache.get(key, "moves")
+        if moves is not None:
+            queue_moves(moves, solver)
+            continue
+        board_rep, tiles = constraint_state.matrix(component)
+
+        # row reduce the board representation
+        reduced_rep = rref(board_rep)
+
+        # determine flag and move operations from the row reduced board representation,
+        # followed by the original rows, whose single point deductions a reduced row can
+        # spread over several rows
+        moves = analyze_matrix(
+            np.vstack((reduced_rep, board_rep)), board_state, tiles, solver
+        )
+        component_cache.put(key, "moves", moves)
+    dirty.clear()
+
+
+"""count the true tiles around every tile of [masks] in one pass by summing the eight
+shifted windows of the zero padded masks, as int8 since a tile has at most 8 neighbors.
+A stack of masks, with the tiles on the last two axes, is counted mask by mask."""
+
+
+def neighbor_counts(masks):
+    masks = np.asarray(masks, dtype=np.int8)
+    row_size, col_size = masks.shape[-2:]
+    padded = np.pad(masks, [(0, 0)] * (masks.ndim - 2) + [(1, 1), (1, 1)])
+    counts = np.zeros(masks.shape, dtype=np.int8)
+    for i, j in coordinates:
+        counts += padded[..., 1 + i : 1 + i + row_size, 1 + j : 1 + j + col_size]
+    return counts
 
 
 """Given a board_state, run the single point solver. This consists of checking
  whether given the surrounding mine count of a tile, can we reveals known mines 
  or bombs. We may flag tiles if the mine count == unopened tile count, and we
- may open tiles if the mine count == flagged count"""
+ may open tiles if the mine count == flagged count. With a [constraint_state] only
+ the constraints changed since the last solve are checked, as the others have given
+ all their moves already, and the tiles found are taken as known at once, so the
+ constraints around them are checked again in the same call. Without one the whole
+ board is checked at once from the counts of unopened and flagged neighbors of every
+ tile. Moves go to the queue of [solver], default_solver when it is not given."""
 
 
-def SP_solver(board_state):
-    col_size = len(board_state[0])
-    row_size = len(board_state)
-    for r in range(row_size):
-        for c in range(col_size):
-            mine_count = board_state[r][c]
-            unopened_tiles = []
-            flaged_tiles = []
-            if mine_count > 0:
-                for i, j in coordinates:
-                    if (
-                        r + i >= 0
-                        and j + c >= 0
-                        and j + c < col_size
-                        and r + i < row_size
-                    ):
-                        if board_state[r + i][j + c] == -1:
-                            unopened_tiles.append((r + i, j + c))
-                        elif board_state[r + i][j + c] == -2:
-                            flaged_tiles.append((r + i, j + c))
-                if len(flaged_tiles) == mine_count:
-                    for x, y in unopened_tiles:
-                        if (x, y) not in empty:
-                            queue.append(("open", x, y))
-                            empty.add((x, y))
-                elif len(unopened_tiles) + len(flaged_tiles) == mine_count:
-                    for x, y in unopened_tiles:
-                        if (x, y) not in mines:
-                            queue.append(("flag", x, y))
-                            mines.add((x, y))
-
-
-"""Given a board_state, choose a random unopened tile """
-
-
-def random_move(board_state):
+def SP_solver(board_state, constraint_state=None, solver=None):
+    if solver is None:
+        solver = default_solver
+    queue, mines, empty = solver.queue, solver.mines, solver.empty
+    if constraint_state is not None:
+        constraint_state.update(board_state)
+
+        # the constraints left to check, starting from the changed ones. A tile found
+        # safe or a mine changes the constraints around it, so those are checked again
+        # until no more moves are found
+        work = deque(sorted(constraint_state.dirty))
+        pending = set(work)
+        while work:
+            tile = work.popleft()
+            pending.discard(tile)
+            if tile not in constraint_state.constraints:
+                continue
+            unknown, remaining = constraint_state.constraints[tile]
+            # leave out the tiles already known, counting the mines among them
+            remaining -= len(unknown & mines)
+            unknown = unknown - mines - empty
+            if not unknown:
+                continue
+            if remaining == 0:
+                opp, known = "open", empty
+            elif remaining == len(unknown):
+                opp, known = "flag", mines
+            else:
+                continue
+            for x, y in sorted(unknown):
+                queue.append((opp, x, y))
+                known.add((x, y))
+                for other in constraint_state.tile_constraints[(x, y)]:
+                    if other not in pending:
+                        pending.add(other)
+                        work.append(other)
+        constraint_state.dirty.clear()
+        return
+    board_state = np.asarray(board_state)
+    hidden, flags = neighbor_counts(np.stack((board_state == -1, board_state == -2)))
+    numbered = board_state > 0
+
+    # the numbers whose mines are all flagged, and those whose unopened tiles are all
+    # mines, spread onto their unopened neighbors
+    satisfied = numbered & (flags == board_state)
+    full = numbered & ~satisfied & (hidden + flags == board_state)
+    unknown = board_state == -1
+    opened, flagged = neighbor_counts(np.stack((satisfied, full))) > 0
+    for x, y in np.argwhere(opened & unknown).tolist():
+        if (x, y) not in empty:
+            queue.append(("open", x, y))
+            empty.add((x, y))
+    for x, y in np.argwhere(flagged & unknown).tolist():
+        if (x, y) not in mines:
+            queue.append(("flag", x, y))
+            mines.add((x, y))
+
+
+# the 8 symmetries of a 5 x 5 neighborhood, as the flat index each tile of the
+# transformed neighborhood is read from
+pattern_symmetries = np.array(
+    [
+        np.rot90(grid, k).ravel()
+        for grid in (np.arange(25).reshape(5, 5), np.arange(25).reshape(5, 5).T)
+        for k in range(4)
+    ]
+)
+
+# the flat indices of the inner 3 x 3 tiles of a 5 x 5 neighborhood, whose neighbors all
+# lie inside it, so only their constraints are kept
+pattern_inner = np.array([6, 7, 8, 11, 12, 13, 16, 17, 18])
+pattern_outer = np.setdiff1d(np.arange(25), pattern_inner)
+pattern_inner_mask = np.isin(np.arange(25), pattern_inner).reshape(5, 5)
+
+# a neighborhood is coded with a digit per tile: 0 for a tile that is not unknown, 1 for
+# an unknown tile and 2 + its remaining mines for an inner tile with unknown neighbors.
+# An inner tile is a base 11 digit and an outer one, being 0 or 1, a bit above them, so a
+# neighborhood fits in a single integer
+pattern_weights = np.zeros(25, dtype=np.int64)
+pattern_weights[pattern_inner] = 11 ** np.arange(9, dtype=np.int64)
+pattern_weights[pattern_outer] = 11**9 * 2 ** np.arange(16, dtype=np.int64)
+
+# the moves every neighborhood seen so far forces, under its canonical code
+pattern_table = {}
+
+# the number of neighborhoods pattern_table holds before it is emptied
+pattern_table_size = 100000
+
+# whether the tiered model looks for the moves of local patterns between its single point
+# and CSP tiers. It is off, as next to the incremental, cached CSP solver the pattern pass
+# measured slower than row reducing the frontier straight away
+pattern_tier = False
+
+"""the moves the neighborhood with the canonical code [key] forces, from the constraints
+of its inner tiles alone. Any board satisfies those, so a tile that is a mine in none or
+all of their assignments is safe or a mine. Returns the flat indices in the neighborhood
+of the safe tiles and of the mines."""
+
+
+def solve_pattern(key):
+    codes = np.zeros(25, dtype=np.int64)
+    codes[pattern_inner] = (key % 11**9) // 11 ** np.arange(9) % 11
+    codes[pattern_outer] = (key // 11**9) >> np.arange(16) & 1
+    codes = codes.reshape(5, 5)
+    constraints = []
+    for r, c in zip(*np.nonzero(codes >= 2)):
+        unknown = [
+            (int(r + i), int(c + j)) for i, j in coordinates if codes[r + i][c + j] == 1
+        ]
+        constraints.append((tuple(sorted(unknown)), int(codes[r][c]) - 2))
+    tiles, counts = enumerate_component(tuple(sorted(constraints)))
+    total = sum(assignments for assignments, tile_mines in counts.values())
+    if not total:
+        return [], []
+    tile_mines = np.sum([tile_mines for assignments, tile_mines in counts.values()], 0)
+    flat = [r * 5 + c for r, c in tiles]
+    safe = [tile for tile, mines in zip(flat, tile_mines) if mines == 0]
+    mined = [tile for tile, mines in zip(flat, tile_mines) if mines == total]
+    return safe, mined
+
+
+"""Given a board_state, deduce moves from local patterns such as 1-2-1 and 1-2-2-1. The
+5 x 5 neighborhood of every numbered tile with unopened neighbors is coded for all 8
+symmetries at once, and its smallest code is looked up in pattern_table, so a pattern
+is solved once for every rotation and reflection of it. With a [constraint_state] only
+the neighborhoods holding a constraint changed since the last solve are looked up, as
+the code of a neighborhood only changes with the constraints of its inner tiles. Returns
+every move the patterns give, known or not, after adding the new ones to the queue of
+[solver], default_solver when it is not given."""
+
+
+def pattern_solver(board_state, constraint_state=None, solver=None):
+    board_state = np.asarray(board_state)
+    row_size, col_size = board_state.shape
+
+    # the tiles each neighborhood is centered on, all of them without a constraint_state
+    # and those next to a changed constraint with one
+    centers = np.ones(board_state.shape, dtype=bool)
+    if constraint_state is not None:
+        constraint_state.update(board_state)
+        if not constraint_state.dirty:
+            return []
+        dirty = np.zeros((row_size + 2, col_size + 2), dtype=bool)
+        rows, cols = np.array(sorted(constraint_state.dirty)).T
+        dirty[rows + 1, cols + 1] = True
+        for i, j in coordinates:
+            dirty[rows + 1 + i, cols + 1 + j] = True
+        centers = dirty[1:-1, 1:-1]
+
+    unknown = board_state == -1
+    hidden, flags = neighbor_counts(np.stack((unknown, board_state == -2)))
+    numbered = (board_state > 0) & (hidden > 0)
+    remaining = np.clip(board_state.astype(np.int64) - flags, 0, 8)
+    codes = np.zeros((row_size + 4, col_size + 4), dtype=np.int64)
+    codes[2:-2, 2:-2] = unknown + np.where(numbered, 2 + remaining, 0)
+    centers = np.argwhere(numbered & centers)
+    if not len(centers):
+        return []
+
+    # the neighborhood of each center, with the numbers of its outer tiles left out and
+    # only the unknown tiles next to a constraint kept, as no other tile changes its moves
+    windows = np.lib.stride_tricks.sliding_window_view(codes, (5, 5))
+    windows = windows[centers[:, 0], centers[:, 1]]
+    windows = np.where(pattern_inner_mask, windows, windows == 1)
+    constrained = np.zeros((len(windows), 7, 7), dtype=bool)
+    for i, j in coordinates:
+        constrained[:, 1 + i : 6 + i, 1 + j : 6 + j] |= windows >= 2
+    windows[(windows == 1) & ~constrained[:, 1:-1, 1:-1]] = 0
+    windows = windows.reshape(-1, 25)
+    symmetric_keys = windows[:, pattern_symmetries] @ pattern_weights
+    symmetry = np.argmin(symmetric_keys, axis=1)
+    keys = np.amin(symmetric_keys, axis=1)
+
+    # look each distinct neighborhood up once, and place the moves of those forcing any
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    deductions = []
+    for key in unique_keys.tolist():
+        # read the table once, as a solver on another thread may empty it in between
+        deduction = pattern_table.get(key)
+        if deduction is None:
+            if len(pattern_table) >= pattern_table_size:
+                pattern_table.clear()
+            deduction = pattern_table[key] = solve_pattern(key)
+        deductions.append(deduction)
+    forcing = np.array([bool(safe or mined) for safe, mined in deductions])
+    moves = set()
+    for n in np.flatnonzero(forcing[inverse.ravel()]):
+        safe, mined = deductions[inverse.ravel()[n]]
+        for opp, tiles in (("open", safe), ("flag", mined)):
+            for tile in pattern_symmetries[symmetry[n]][tiles]:
+                r, c = divmod(int(tile), 5)
+                moves.add((opp, int(centers[n][0]) + r - 2, int(centers[n][1]) + c - 2))
+    moves = sorted(moves)
+    queue_moves(moves, solver)
+    return moves
+
+
+# the random source of the AI when the caller does not pass its own numpy Generator
+default_rng = np.random.default_rng()
+
+"""Given a board_state, choose a random unopened tile using the numpy Generator [rng],
+and add it to the empty tiles of [solver], default_solver when it is not given"""
+
+
+def random_move(board_state, rng=None, solver=None):
+    if rng is None:
+        rng = default_rng
+    if solver is None:
+        solver = default_solver
     unopened = np.argwhere(board_state == -1)
-    index = np.random.choice(len(unopened))
+    index = rng.integers(len(unopened))
     r, c = unopened[index][0], unopened[index][1]
-    empty.add((r, c))
-    print("random!")
+    solver.empty.add((r, c))
     return ("open", r, c)
 
 
 """Given a board_state and bomb_count, output the tile with the lowest local probability.
 If there is a conflict when assigning a local probability, assign the the highest probability
-to that tile """
+to that tile. Ties are broken with the numpy Generator [rng]. The local probabilities of
+the whole board are computed at once, as the ratio of each number to its unopened
+neighbors taken as a maximum over the 8 shifts of the ratio map."""
 
 
-def select_tile_with_lowest_local_probability(board_state, bomb_count):
-    col_size = len(board_state[0])
-    row_size = len(board_state)
-    local_probabilites = np.ones_like(board_state).astype(float)
+def select_tile_with_lowest_local_probability(board_state, bomb_count, rng=None):
+    if rng is None:
+        rng = default_rng
+    board_state = np.asarray(board_state)
+    row_size, col_size = board_state.shape
+    unknown = board_state == -1
+    hidden, flags = neighbor_counts(np.stack((unknown, board_state == -2)))
+
+    # the mines each number has left over its unopened neighbors
+    mine_count = board_state - flags
+    ratio = np.zeros((row_size + 2, col_size + 2))
+    numbered = (board_state > 0) & (mine_count > 0) & (hidden > 0)
+    ratio[1:-1, 1:-1][numbered] = mine_count[numbered] / hidden[numbered]
+
     # find the probability of all the mines in the frontier set
     # if there is a conflicting probability, assign the highest local probability
-    for r in range(row_size):
-        for c in range(col_size):
-            mine_count = board_state[r][c]
-            unopened_tiles = []
-            flaged_tiles = []
-            if mine_count != -1:
-                local_probabilites[r][c] = 2
-            if mine_count > 0:
-                for i, j in coordinates:
-                    if (
-                        r + i >= 0
-                        and j + c >= 0
-                        and j + c < col_size
-                        and r + i < row_size
-                    ):
-                        if board_state[r + i][j + c] == -1:
-                            unopened_tiles.append((r + i, j + c))
-                        elif board_state[r + i][j + c] == -2:
-                            flaged_tiles.append((r + i, j + c))
-                mine_count = mine_count - len(flaged_tiles)
-                if mine_count > 0:
-                    for x, y in unopened_tiles:
-                        lp = mine_count / len(unopened_tiles)
-                        if (
-                            local_probabilites[x][y] == 1
-                            or lp > local_probabilites[x][y]
-                        ):
-                            local_probabilites[x][y] = lp
-
-    # the amount of bombs in the unknown set
-    unknown_set_count = np.sum(local_probabilites[local_probabilites == 1])
+    local_ratio = np.zeros(board_state.shape)
+    for i, j in coordinates:
+        np.maximum(
+            local_ratio,
+            ratio[1 + i : 1 + i + row_size, 1 + j : 1 + j + col_size],
+            out=local_ratio,
+        )
+    frontier = unknown & (local_ratio > 0)
+    local_probabilites = np.where(frontier, local_ratio, 2.0)
+
+    # the unopened tiles no number gives a probability
+    unknown_set = unknown & ~frontier
+    unknown_set_count = np.count_nonzero(unknown_set)
 
     # we are considering the unkown set for selection because it is not always the best to select from the frontier
     if unknown_set_count > 0:
         # by the linearity of expectation - we can estimate the amount of bombs in the frontier set
-        frontier_set_expected_mines = np.sum(local_probabilites[local_probabilites < 1])
+        frontier_set_expected_mines = np.sum(local_ratio[frontier])
         # probability of any tile in the unkown set being a mine
         unexplored_probabilites = (
             bomb_count
             - frontier_set_expected_mines
-            - np.count_nonzero(board_state[board_state == -2])
+            - np.count_nonzero(board_state == -2)
         ) / unknown_set_count
         # set all tiles in the unkown set to the same probability
-        local_probabilites[local_probabilites == 1] = unexplored_probabilites
+        local_probabilites[unknown_set] = unexplored_probabilites
 
     # find lowest probabiltiy
     lowest_probability = np.amin(local_probabilites)
@@ -222,47 +826,635 @@ def select_tile_with_lowest_local_probability(board_state, bomb_count):
     indices = np.argwhere(local_probabilites == lowest_probability)
 
     # find a random tile out of all of the lowest probability tiles
-    select = np.random.randint(0, len(indices))
+    select = rng.integers(0, len(indices))
 
     return indices[select][0], indices[select][1]
 
 
+# components with more unknown tiles than this are sampled instead of enumerated when a
+# deadline is given
+exact_component_size = 64
+
+# the seconds an uncertain move may spend sampling the components too large to enumerate
+sample_time = 0.05
+
+# the draws each sampled component gets instead of sampling until the deadline when it is
+# set, so the guesses of a seeded game do not depend on how fast it is played
+sample_draws = None
+
+"""the order in which the tiles of [constraints], the key of a frontier component, are
+assigned: constraint by constraint, so constraints are completed early. Returns the tiles
+in that order, their positions in it, and for each position the constraints of its tile
+with the number of their tiles left after it, and the constraints that are partly
+assigned before it."""
+
+
+def component_order(constraints):
+    order = []
+    seen = set()
+    for unknown, remaining in constraints:
+        for tile in unknown:
+            if tile not in seen:
+                seen.add(tile)
+                order.append(tile)
+    index = {tile: i for i, tile in enumerate(order)}
+    tile_constraints = [[] for _ in order]
+    tile_left = [[] for _ in order]
+    active = [[] for _ in range(len(order) + 1)]
+    for c, (unknown, remaining) in enumerate(constraints):
+        positions = sorted(index[tile] for tile in unknown)
+        for left, t in enumerate(reversed(positions)):
+            tile_constraints[t].append(c)
+            tile_left[t].append(left)
+        for t in range(positions[0] + 1, positions[-1] + 1):
+            active[t].append(c)
+    return order, index, tile_constraints, tile_left, active
+
+
+"""enumerate the mine assignments that satisfy [constraints], the key of a frontier
+component: a tuple of (unknown tiles, remaining mines) pairs. Tiles are assigned in the
+order of component_order, and a branch is cut as soon as a constraint can no longer be
+met. The assignments of the tiles from a given one on only depend on the mines still
+needed by the constraints that are partly assigned, so they are memoized under those.
+Returns the sorted unknown tiles, and a dictionary from the number of mines of an
+assignment to [assignments, tile_mines], the number of assignments with that many mines
+and how many of them put a mine on each tile."""
+
+
+def enumerate_component(constraints):
+    order, index, tile_constraints, tile_left, active = component_order(constraints)
+    need = [remaining for unknown, remaining in constraints]
+    memo = {}
+
+    # the assignments of the tiles from [t] on, as a dictionary from their number of
+    # mines to (assignments, tile_mines)
+    def assign(t):
+        if t == len(order):
+            return {0: (1, [])}
+        key = (t, tuple(need[c] for c in active[t]))
+        if key in memo:
+            return memo[key]
+        counts = {}
+        for value in (0, 1):
+            valid = True
+            for c, left in zip(tile_constraints[t], tile_left[t]):
+                need[c] -= value
+                if need[c] < 0 or need[c] > left:
+                    valid = False
+            if valid:
+                for k, (assignments, tile_mines) in assign(t + 1).items():
+                    tile_mines = [assignments * value] + tile_mines
+                    if k + value in counts:
+                        total, total_mines = counts[k + value]
+                        assignments += total
+                        tile_mines = [a + b for a, b in zip(total_mines, tile_mines)]
+                    counts[k + value] = (assignments, tile_mines)
+            for c in tile_constraints[t]:
+                need[c] += value
+        memo[key] = counts
+        return counts
+
+    # report the mines per tile in sorted tile order
+    tiles = sorted(order)
+    counts = {
+        k: [assignments, [tile_mines[index[tile]] for tile in tiles]]
+        for k, (assignments, tile_mines) in assign(0).items()
+    }
+    return tiles, counts
+
+
+"""the product of two distributions, dictionaries from a number of mines to the number
+of ways to place them."""
+
+
+def convolve(first, second):
+    product = {}
+    for i, ways_i in first.items():
+        for j, ways_j in second.items():
+            product[i + j] = product.get(i + j, 0) + ways_i * ways_j
+    return product
+
+
+"""draw random mine assignments that satisfy [constraints], the key of a frontier
+component, until time.perf_counter() passes [deadline], or [draws] of them when it is
+given, whatever the time. Each draw assigns the tiles in
+the order of component_order, picking the value with the numpy Generator [rng] where both
+values can still meet the constraints, and ends with a weight of 0 where neither can. A
+completed draw is weighted by the inverse of the probability of drawing it, so weighted
+averages over the draws estimate averages over all assignments. Returns the sorted
+unknown tiles, the draws as a (draws, tiles) boolean array in that order, and the number
+of mines and the weight of each draw."""
+
+
+def sample_component(constraints, deadline, rng, draws=None):
+    order, index, tile_constraints, tile_left, active = component_order(constraints)
+    remaining = [remaining for unknown, remaining in constraints]
+    assignments = []
+    weights = []
+    while (
+        not weights
+        or (draws is None and time.perf_counter() < deadline)
+        or (draws is not None and len(weights) < draws)
+    ):
+        need = list(remaining)
+        assignment = [0] * len(order)
+        weight = 1.0
+        coins = rng.integers(0, 2, len(order))
+        for t in range(len(order)):
+            values = [
+                value
+                for value in (0, 1)
+                if all(
+                    0 <= need[c] - value <= left
+                    for c, left in zip(tile_constraints[t], tile_left[t])
+                )
+            ]
+            if not values:
+                weight = 0.0
+                break
+            if len(values) == 2:
+                weight *= 2
+                value = values[coins[t]]
+            else:
+                value = values[0]
+            assignment[t] = value
+            for c in tile_constraints[t]:
+                need[c] -= value
+        assignments.append(assignment)
+        weights.append(weight)
+
+    tiles = sorted(order)
+    assignments = np.array(assignments, dtype=bool)[:, [index[t] for t in tiles]]
+    return tiles, assignments, assignments.sum(axis=1), np.array(weights)
+
+
+"""the dictionary of enumerate_component estimated from the draws of sample_component.
+The counts are scaled by a constant, which cancels out of the probabilities, and rounded
+to integers so they combine exactly with the integer counts of the other components."""
+
+
+def sampled_counts(assignments, mine_counts, weights):
+    scale = 2.0**60 / max(weights.sum(), 1)
+    counts = {}
+    for k in np.unique(mine_counts[weights > 0]):
+        drawn = (mine_counts == k) & (weights > 0)
+        scaled = weights[drawn] * scale
+        counts[int(k)] = [
+            int(scaled.sum()),
+            [int(mines) for mines in scaled @ assignments[drawn]],
+        ]
+    return counts
+
+
+"""Given a board_state and bomb_count, compute the exact probability that each tile is a
+mine, with every board consistent with board_state equally likely. The assignments of
+each frontier component are enumerated, and weighted by the number of ways the mines they
+leave can be placed on the unopened tiles off the frontier. Opened tiles are nan and
+flagged tiles 1. Returns None if no board is consistent with board_state."""
+
+
+def mine_probabilities(board_state, bomb_count, constraint_state=None):
+    estimate = estimate_mine_probabilities(board_state, bomb_count, constraint_state)
+    if estimate is None:
+        return None
+    return estimate[0]
+
+
+"""mine_probabilities, where with a [deadline] the components with more than
+exact_component_size unknown tiles are sampled with sample_component until
+time.perf_counter() passes it instead of being enumerated. The time left is shared evenly
+between the components still to be sampled. With [draws] each of them gets that many
+draws instead, whatever the time. The draws come from a Generator seeded with a single
+draw from the numpy Generator [rng], so what is left of [rng] does not depend on how
+many draws were made. Returns the probabilities and the half widths of their 95%
+confidence intervals, which cover the sampling of the component of each tile, so they
+are 0 for the tiles of enumerated components and off the frontier. Returns None if no
+board is consistent with board_state, or none was drawn."""
+
+
+def estimate_mine_probabilities(
+    board_state, bomb_count, constraint_state=None, deadline=None, rng=None, draws=None
+):
+    if rng is None:
+        rng = default_rng
+    if constraint_state is None:
+        constraint_state = ConstraintState()
+    constraint_state.update(board_state)
+    board_state = np.asarray(board_state)
+
+    keys = [
+        constraint_state.key(component) for component in constraint_state.components()
+    ]
+    sizes = [len(set().union(*(unknown for unknown, remaining in key))) for key in keys]
+    sampling = deadline is not None or draws is not None
+    sampled = [sampling and size > exact_component_size for size in sizes]
+    if any(sampled):
+        sample_rng = np.random.default_rng(rng.integers(2**63))
+    samples = {}
+    components = []
+    for i, key in enumerate(keys):
+        if not sampled[i]:
+            counts = component_cache.get(key, "probabilities")
+            if counts is None:
+                counts = enumerate_component(key)
+                component_cache.put(key, "probabilities", counts)
+            components.append(counts)
+            continue
+        share = None
+        if draws is None:
+            now = time.perf_counter()
+            share = now + max(deadline - now, 0) / sum(sampled[i:])
+        tiles, assignments, mine_counts, weights = sample_component(
+            key, share, sample_rng, draws
+        )
+        samples[i] = (assignments, mine_counts, weights)
+        components.append((tiles, sampled_counts(assignments, mine_counts, weights)))
+
+    # the unopened tiles no constraint reaches, and the mines left for the board
+    unconstrained = int(np.count_nonzero(board_state == -1)) - len(
+        constraint_state.tile_constraints
+    )
+    mines_left = int(bomb_count - np.count_nonzero(board_state == -2))
+
+    def ways(mine_count):
+        if 0 <= mine_count <= unconstrained:
+            return math.comb(unconstrained, mine_count)
+        return 0
+
+    # the distributions of all components before and after each component
+    distributions = [
+        {k: count[0] for k, count in counts.items()} for tiles, counts in components
+    ]
+    before = [{0: 1}]
+    for distribution in distributions:
+        before.append(convolve(before[-1], distribution))
+    after = [{0: 1}]
+    for distribution in reversed(distributions):
+        after.append(convolve(after[-1], distribution))
+    after.reverse()
+
+    total = sum(w * ways(mines_left - s) for s, w in before[-1].items())
+    if not total:
+        return None
+
+    probabilities = np.full(board_state.shape, np.nan)
+    probabilities[board_state == -2] = 1
+    errors = np.zeros(board_state.shape)
+    if unconstrained:
+        unconstrained_mines = sum(
+            w * ways(mines_left - s) * (mines_left - s) for s, w in before[-1].items()
+        )
+        probabilities[board_state == -1] = unconstrained_mines / (unconstrained * total)
+    for i, (tiles, counts) in enumerate(components):
+        others = convolve(before[i], after[i + 1])
+        tile_mines = np.zeros(len(tiles), dtype=object)
+        weights = {}
+        for k, (assignments, mines_per_tile) in counts.items():
+            weights[k] = sum(w * ways(mines_left - k - s) for s, w in others.items())
+            tile_mines += np.array(mines_per_tile, dtype=object) * weights[k]
+        rows, cols = np.array(tiles).T
+        probabilities[rows, cols] = [mines / total for mines in tile_mines]
+
+        if i in samples:
+            # the standard error of a weighted average of the draws
+            assignments, mine_counts, draw_weights = samples[i]
+            largest = max(weights.values())
+            draw_weights = draw_weights * np.array(
+                [weights.get(int(k), 0) / largest for k in mine_counts]
+            )
+            deviations = (assignments - probabilities[rows, cols]) ** 2
+            errors[rows, cols] = (
+                1.96 * np.sqrt(draw_weights**2 @ deviations) / draw_weights.sum()
+            )
+    return probabilities, errors
+
+
+"""Given a board_state and bomb_count, output the tile with the lowest exact probability
+of being a mine, from estimate_mine_probabilities, which samples the components too large
+to enumerate until [deadline], or [draws] times each. Ties are broken with the numpy
+Generator [rng]. Falls back to the local probability if no board is consistent with
+board_state."""
+
+
+def select_tile_with_lowest_exact_probability(
+    board_state, bomb_count, rng=None, constraint_state=None, deadline=None, draws=None
+):
+    if rng is None:
+        rng = default_rng
+    estimate = estimate_mine_probabilities(
+        board_state, bomb_count, constraint_state, deadline, rng, draws
+    )
+    if estimate is None:
+        return select_tile_with_lowest_local_probability(board_state, bomb_count, rng)
+    probabilities = np.where(np.asarray(board_state) == -1, estimate[0], np.inf)
+
+    # find all indices of the lowest probability, allowing for rounding
+    indices = np.argwhere(probabilities <= np.amin(probabilities) + 1e-12)
+
+    # find a random tile out of all of the lowest probability tiles
+    select = rng.integers(0, len(indices))
+
+    return indices[select][0], indices[select][1]
+
+
+# the CSP models switch to the endgame mode once this many unopened tiles or fewer are left
+endgame_threshold = 64
+
+"""whether [board_state] has at most endgame_threshold unopened tiles left."""
+
+
+def is_endgame(board_state):
+    return np.count_nonzero(np.asarray(board_state) == -1) <= endgame_threshold
+
+
+"""Given a board_state and bomb_count, find the moves that follow from the global mine
+count as well as the frontier. mine_probabilities counts every board consistent with
+board_state, enumerating each component with memoized subproblems, so the unopened tiles
+with a probability of 0 are certain to be empty and those with a probability of 1 certain
+to be mines. This finds the moves that only the number of mines left settles, which the
+CSP solver misses. Moves go to the queue of [solver], default_solver when it is not
+given. Returns the probabilities, or None if no board is consistent with board_state."""
+
+
+def endgame_solver(board_state, bomb_count, constraint_state=None, solver=None):
+    probabilities = mine_probabilities(board_state, bomb_count, constraint_state)
+    if probabilities is None:
+        return None
+    unopened = np.asarray(board_state) == -1
+    certain = unopened & ((probabilities == 0) | (probabilities == 1))
+    moves = [
+        ("flag" if probabilities[r, c] == 1 else "open", int(r), int(c))
+        for r, c in np.argwhere(certain)
+    ]
+    queue_moves(moves, solver)
+    return probabilities
+
+
+"""The state of the AI for one game: its knowledge base, the moves it has found but not
+made yet and the frontier constraints of the board. Every game played at the same time
+needs a solver of its own, while the caches of solved components, patterns and
+probabilities only depend on the constraints and are shared by all of them. tier_stats
+maps each tier that has run - "SP", "pattern", "CSP", "endgame" or "guess" - to
+[moves, seconds], the moves it has found and the time it has taken over every game of
+the solver."""
+
+
+class HeuristicSolver(object):
+    def __init__(self):
+        # represents the knowledge base of the AI, so that moves are not duplicated
+        self.mines = set()
+        self.empty = set()
+
+        # store moves as a tripple - (opp, r, c) - where opp is "flag" or "mine" and
+        # and r and c represent coordinates row and columns respectively
+        self.queue = deque()
+
+        # the frontier constraints of the current game, updated as the board state changes
+        self.constraint_state = ConstraintState()
+
+        self.tier_stats = {}
+
+    """forget the game played so far, keeping the same queue and sets."""
+
+    def clear(self):
+        self.queue.clear()
+        self.mines.clear()
+        self.empty.clear()
+        self.constraint_state.clear()
+
+    """call [solve] with [args] as the tier [tier], adding the moves it queues and the
+    time it takes to tier_stats. Returns what [solve] returns."""
+
+    def run_tier(self, tier, solve, *args):
+        moves = len(self.queue)
+        start = time.perf_counter()
+        result = solve(*args)
+        stats = self.tier_stats.setdefault(tier, [0, 0.0])
+        stats[0] += len(self.queue) - moves
+        stats[1] += time.perf_counter() - start
+        return result
+
+    """the solvers of [certain_move_model] to run on [board_state] in turn, until one of
+    them finds a move, as tuples of the tier, the solver and its arguments. In the
+    [endgame] the endgame solver runs last, with the global mine count [bomb_count]."""
+
+    def tiers(self, board_state, bomb_count, certain_move_model, endgame=False):
+        constraint_state = self.constraint_state
+        if not certain_move_model:
+            return [("SP", SP_solver, board_state, None, self)]
+        tiers = [("CSP", CSP_solver, board_state, constraint_state, self)]
+        if certain_move_model == 2:
+            if pattern_tier:
+                tiers.insert(
+                    0, ("pattern", pattern_solver, board_state, constraint_state, self)
+                )
+            tiers.insert(0, ("SP", self.tiered_SP_solver, board_state))
+        if endgame:
+            tiers.append(
+                (
+                    "endgame",
+                    endgame_solver,
+                    board_state,
+                    bomb_count,
+                    constraint_state,
+                    self,
+                )
+            )
+        return tiers
+
+    """run SP_solver on the dirty constraints as the first tier of the tiered model. The
+    constraints it checks stay dirty, so the pattern and CSP tiers still see them when
+    they run later."""
+
+    def tiered_SP_solver(self, board_state):
+        self.constraint_state.update(board_state)
+        dirty = set(self.constraint_state.dirty)
+        SP_solver(board_state, self.constraint_state, self)
+        self.constraint_state.dirty |= dirty
+
+    """the uncertain move of [uncertain_move_strat] on [board_state]. In the [endgame]
+    the probability strategies both guess the tile with the lowest exact probability,
+    with every component enumerated."""
+
+    def guess(self, board_state, bomb_count, uncertain_move_strat, rng, endgame=False):
+        # if no queue chose a random unopened tile
+        if not uncertain_move_strat:
+            return random_move(board_state, rng, self)
+        elif uncertain_move_strat == 1 and not endgame:
+            r, c = select_tile_with_lowest_local_probability(
+                board_state, bomb_count, rng
+            )
+            return ("open", r, c)
+        else:
+            deadline, draws = None, None
+            if not endgame:
+                deadline, draws = time.perf_counter() + sample_time, sample_draws
+            r, c = select_tile_with_lowest_exact_probability(
+                board_state, bomb_count, rng, self.constraint_state, deadline, draws
+            )
+            return ("open", r, c)
+
+    """run the tiers of [certain_move_model] on [board_state] until one of them queues a
+    move. Returns None if one did, and else the uncertain move of
+    [uncertain_move_strat]. The CSP models are in the endgame once is_endgame holds."""
+
+    def solve(
+        self, board_state, bomb_count, certain_move_model, uncertain_move_strat, rng
+    ):
+        endgame = bool(certain_move_model) and is_endgame(board_state)
+        tiers = self.tiers(board_state, bomb_count, certain_move_model, endgame)
+        for tier, tier_solver, *args in tiers:
+            self.run_tier(tier, tier_solver, *args)
+            if self.queue:
+                return None
+
+        move = self.run_tier(
+            "guess",
+            self.guess,
+            board_state,
+            bomb_count,
+            uncertain_move_strat,
+            rng,
+            endgame,
+        )
+        self.tier_stats["guess"][0] += 1
+        return move
+
+    """Given a board_state output an opp: open or flag, an a coordinate r, c to do such
+    operation. The strategies are those of ai_heuristic_logic. [changed] lists the tiles
+    that changed since the last call, so the constraints are brought up to date from
+    them instead of from a comparison of the whole board."""
+
+    def ai_heuristic_logic(
+        self,
+        board_state,
+        first_move,
+        bomb_count,
+        certain_move_model,
+        uncertain_move_strat,
+        rng=None,
+        changed=None,
+    ):
+        queue = self.queue
+        if first_move:
+            self.clear()
+        if changed is not None and certain_move_model:
+            self.constraint_state.update(board_state, changed)
+
+        # If a move remains from last AI call, return move
+        if queue:
+            return queue.popleft()
+
+        move = self.solve(
+            board_state, bomb_count, certain_move_model, uncertain_move_strat, rng
+        )
+
+        # If trivial move was found, make trivial move
+        if move is None:
+            return queue.popleft()
+        return move
+
+    """ai_heuristic_logic handing over every certain move found in one pass at once, as
+    a list of (opp, r, c) moves in the order ai_heuristic_logic returns them one by one.
+    Returns a list of the single uncertain move when there are no certain moves."""
+
+    def ai_heuristic_moves(
+        self,
+        board_state,
+        first_move,
+        bomb_count,
+        certain_move_model,
+        uncertain_move_strat,
+        rng=None,
+        changed=None,
+    ):
+        queue = self.queue
+        if first_move:
+            self.clear()
+        if changed is not None and certain_move_model:
+            self.constraint_state.update(board_state, changed)
+
+        if not queue:
+            move = self.solve(
+                board_state, bomb_count, certain_move_model, uncertain_move_strat, rng
+            )
+            if move is not None:
+                return [move]
+        moves = list(queue)
+        queue.clear()
+        return moves
+
+
+# the solver of ai_heuristic_logic, whose knowledge base, queue and constraints are also
+# the module level mines, empty, queue and constraint_state
+default_solver = HeuristicSolver()
+mines = default_solver.mines
+empty = default_solver.empty
+queue = default_solver.queue
+constraint_state = default_solver.constraint_state
+
 """Given a board_state output an opp: open or flag, an a coordinate r, c to do such operation """
 
 # certain_move shows how we developed the AI's certain move strategy
 # 0 is the basic strategy where it makes a move based on information at a single point
 # 1 takes into account all the information we know and creates a constraint satisfaction problem
+# 2 is tiered: the single point solver, then the constraint satisfaction problem, running
+# only when the single point solver found nothing, with local patterns in between when
+# pattern_tier is set
+# with at most endgame_threshold unopened tiles left, 1 and 2 are in the endgame: the
+# endgame solver runs last, using the number of mines left, and uncertain strategies 1
+# and 2 guess the tile with the lowest exact probability
 
 
 # uncertain_move shows how we developed the AI's uncertain move strategy
 # 0 is the basic strategy where it makes a random move if there are no certain moves
 # 1 takes into account the locaal probability of each tile and returns the one with lowest chance of being a mine
-# 2 adds a distance heuristic
+# 2 computes the exact probability of each tile from the assignments of the frontier,
+# sampling the components too large to enumerate for up to sample_time seconds, or
+# sample_draws times each when it is set, which seeded runs replayed exactly need
+# rng is the numpy Generator that random and tie breaking uncertain moves are drawn from
+# changed lists the tiles that changed since the last call, which Game.pop_changed gives
+# the game is played by default_solver, so one game at a time; use a HeuristicSolver of
+# its own for each game played at the same time
 def ai_heuristic_logic(
-    board_state, first_move, bomb_count, certain_move_model, uncertain_move_strat
+    board_state,
+    first_move,
+    bomb_count,
+    certain_move_model,
+    uncertain_move_strat,
+    rng=None,
+    changed=None,
+):
+    return default_solver.ai_heuristic_logic(
+        board_state,
+        first_move,
+        bomb_count,
+        certain_move_model,
+        uncertain_move_strat,
+        rng,
+        changed,
+    )
+
+
+"""ai_heuristic_logic handing over every certain move found in one pass at once, played
+by default_solver the same way."""
+
+
+def ai_heuristic_moves(
+    board_state,
+    first_move,
+    bomb_count,
+    certain_move_model,
+    uncertain_move_strat,
+    rng=None,
+    changed=None,
 ):
-    if first_move:
-        while queue:
-            queue.pop()
-        mines.clear()
-        empty.clear()
-
-    # If a move remains from last AI call, return move
-    if queue:
-        return queue.popleft()
-
-    if not certain_move_model:
-        SP_solver(board_state)
-    else:
-        CSP_solver(board_state)
-
-    # If trivial move was found, make trivial move
-    if queue:
-        return queue.popleft()
-
-    # if no queue chose a random unopened tile
-    if not uncertain_move_strat:
-        return random_move(board_state)
-    else:
-        r, c = select_tile_with_lowest_local_probability(board_state, bomb_count)
-        return ("open", r, c)
+    return default_solver.ai_heuristic_moves(
+        board_state,
+        first_move,
+        bomb_count,
+        certain_move_model,
+        uncertain_move_strat,
+        rng,
+        changed,
+    )
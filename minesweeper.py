@@ -1,73 +1,224 @@
-import random
 import numpy as np
 import heuristic_model
+import result_sink
 import time
-import sys
-import io
-import contextlib
-
-# Raise recursion limit to avoid RecursionError on bigger boards
-sys.setrecursionlimit(2**16)
+from concurrent.futures import ProcessPoolExecutor
 
 # initalized after the first move, board represents the data hidden to the user.
 # Each board is a certain size and has a certain mine count
 # board constants
 mine = 1
+# a board only holds 0 or mine, so one byte per tile is enough
+board_dtype = np.uint8
 
 # initalized at the begining of the game, board state represents the data the
 # user can see.
 # board state constants
 unopened = -1
 flaged = -2
+# a board state only holds -2 to 8
+board_state_dtype = np.int8
 
 
 # the change in tile for each of the 8 surrounding tiles
 coordinates = {(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)}
 
 """initalize minesweeper with a [size] x [size] board and mine count [mine]. 
-does not allow a bomb to be initated at (r,c)"""
+does not allow a bomb to be initated at (r,c). The mines are drawn from [rng], a
+numpy Generator or a seed for one."""
 
 
 
 
-def init_board(size, mine, r, c):
-    board = np.zeros((size, size))
+def init_board(size, mine, r, c, rng=None):
+    rng = np.random.default_rng(rng)
+    board = np.zeros((size, size), dtype=board_dtype)
     first_move = r * size + c
-    left = list(range(0, first_move))
-    right = list(range(first_move + 1, np.square(size)))
-    bombs = random.sample(left + right, mine)
+    # draw from every tile but the first move, then shift the tiles after it by one
+    bombs = rng.choice(np.square(size) - 1, mine, replace=False)
+    bombs[bombs >= first_move] += 1
     board[np.unravel_index(bombs, board.shape)] = 1
     return board
 
 
+"""the seed of game number [game] in a run seeded with [seed]. Any game of a run can be
+replayed on its own by passing its seed as the rng of game_loop."""
+
+
+def game_seed(seed, game):
+    return np.random.SeedSequence(seed, spawn_key=(game,))
+
+
+"""count the surrounding bombs of every tile of [board] in one pass with
+heuristic_model.neighbor_counts. Opening a tile is then a lookup into the returned array
+instead of a scan of its neighbors. A stack of boards, with the tiles on the last two
+axes, is counted board by board in the same pass."""
+
+
+def init_counts(board):
+    return heuristic_model.neighbor_counts(np.asarray(board) == mine)
+
+
+"""label the connected groups of true tiles in [zero], where tiles are connected through
+any of their eight neighbors. Every true tile is labeled with the smallest flat index in
+its group and every other tile with -1. A stack of masks, with the tiles on the last two
+axes, is labeled in the same pass and groups never cross from one mask to another."""
+
+
+def label_zero_tiles(zero):
+    row_size, col_size = zero.shape[-2:]
+    tile_count = zero.size
+    pad_width = [(0, 0)] * (zero.ndim - 2) + [(1, 1), (1, 1)]
+
+    # every zero tile points at the smallest flat index it has been linked to. Each pass
+    # hooks the root of a tile onto the smallest label around it and then jumps every
+    # tile straight to its root, so the passes grow with log(region size)
+    parent = np.append(
+        np.where(zero.ravel(), np.arange(tile_count), tile_count), tile_count
+    )
+    zero_tiles = np.flatnonzero(zero)
+    while True:
+        padded = np.pad(
+            parent[:tile_count].reshape(zero.shape),
+            pad_width,
+            constant_values=tile_count,
+        )
+        smallest = parent[:tile_count].reshape(zero.shape).copy()
+        for r, c in coordinates:
+            np.minimum(
+                smallest,
+                padded[..., 1 + r : 1 + r + row_size, 1 + c : 1 + c + col_size],
+                out=smallest,
+            )
+        smallest = smallest.ravel()[zero_tiles]
+        if np.array_equal(smallest, parent[zero_tiles]):
+            break
+        np.minimum.at(parent, parent[zero_tiles], smallest)
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+    return np.where(zero, parent[:tile_count].reshape(zero.shape), -1)
+
+
+"""label the connected regions of safe tiles with no surrounding bombs. Returns a tripple -
+(labels, region_ptr, region_tiles) - where labels[r][c] is the region of a zero tile or -1
+for any other tile, and region_tiles[region_ptr[l] : region_ptr[l + 1]] are the flat indices
+of region l together with its numbered border, which is every tile a zero click on l reveals."""
+
+
+def init_regions(board, counts):
+    row_size, col_size = counts.shape
+    tile_count = row_size * col_size
+    zero = (counts == 0) & (np.asarray(board) != mine)
+    labels = label_zero_tiles(zero)
+
+    roots, region_of = np.unique(labels[zero], return_inverse=True)
+    labels = np.full((row_size, col_size), -1, dtype=np.int32)
+    labels[zero] = region_of
+
+    # pair each region with its zero tiles and every neighbor of them, then sort the
+    # pairs by region so a region is a contiguous slice of region_tiles
+    zero_r, zero_c = np.nonzero(zero)
+    keys = [region_of * tile_count + zero_r * col_size + zero_c]
+    for r, c in coordinates:
+        nr, nc = zero_r + r, zero_c + c
+        inside = (nr >= 0) & (nc >= 0) & (nr < row_size) & (nc < col_size)
+        keys.append(region_of[inside] * tile_count + nr[inside] * col_size + nc[inside])
+    keys = np.unique(np.concatenate(keys))
+    region_tiles = keys % tile_count
+    region_ptr = np.searchsorted(keys // tile_count, np.arange(len(roots) + 1))
+    return labels, region_ptr, region_tiles
+
+
 """initalize minesweeper with a [size] x [size] board state where all tiles are unopened"""
 
 
 def init_board_state(size):
-    board_state = np.full((size, size), unopened)
+    board_state = np.full((size, size), unopened, dtype=board_state_dtype)
     return board_state
 
 
+"""pack a board into a bit per tile, for keeping many board snapshots in memory or on
+disk. unpack_board gives back the [size] x [size] board of board_dtype."""
+
+
+def pack_board(board):
+    return np.packbits(np.asarray(board) == mine)
+
+
+def unpack_board(packed_board, size):
+    return (
+        np.unpackbits(packed_board, count=size * size)
+        .reshape(size, size)
+        .astype(board_dtype)
+    )
+
+
 """open a tile if not flagged. In board state update the tile with the amount of surrounding bombs.
-If there are no surrounding bombs, open the eight neighbor tiles."""
-
-
-def open_tile(board_state, board, row, col):
-    if board_state[row][col] != flaged:
-        board_state[row][col] = count_surrounding_bombs(board, row, col)
-        if board_state[row][col] == 0 and board[row][col] != mine:
-            for r, c in coordinates:
-                if (
-                    row + r >= 0
-                    and col + c >= 0
-                    and row + r < len(board)
-                    and col + c < len(board[0])
-                ):
-                    if board_state[row + r][col + c] == unopened:
-                        board_state = open_tile(board_state, board, row + r, col + c)
+If there are no surrounding bombs, open the eight neighbor tiles and keep opening outwards
+from every neighbor that has no surrounding bombs either. [counts] is the output of init_counts
+for [board], and is computed here when it is not given. [regions] is the output of init_regions,
+and when given a zero click reveals its whole region in a single assignment."""
+
+
+def open_tile(board_state, board, row, col, counts=None, regions=None):
+    reveal_tile(board_state, board, row, col, counts, regions)
     return board_state
 
 
+"""open a tile in place the same way open_tile does, and return how many tiles went
+from unopened to opened. Those tiles are appended to the list [changed] when it is
+given."""
+
+
+def reveal_tile(board_state, board, row, col, counts=None, regions=None, changed=None):
+    if counts is None:
+        counts = init_counts(board)
+    if changed is None:
+        changed = []
+    if board_state[row][col] == flaged:
+        return 0
+    opened = int(board_state[row][col] == unopened)
+    if opened:
+        changed.append((row, col))
+    board_state[row][col] = counts[row][col]
+    if board_state[row][col] != 0 or board[row][col] == mine:
+        return opened
+    if regions is not None:
+        labels, region_ptr, region_tiles = regions
+        label = labels[row][col]
+        tiles = region_tiles[region_ptr[label] : region_ptr[label + 1]]
+        tile_r, tile_c = np.divmod(tiles, board_state.shape[1])
+        region_state = board_state[tile_r, tile_c]
+        # a flagged zero tile stops the cascade, so only then walk the region tile by tile
+        if not np.any((region_state == flaged) & (counts[tile_r, tile_c] == 0)):
+            hidden = region_state == unopened
+            board_state[tile_r[hidden], tile_c[hidden]] = counts[
+                tile_r[hidden], tile_c[hidden]
+            ]
+            changed.extend(zip(tile_r[hidden].tolist(), tile_c[hidden].tolist()))
+            return opened + int(np.count_nonzero(hidden))
+    stack = [(row, col)]
+    while stack:
+        row, col = stack.pop()
+        for r, c in coordinates:
+            if (
+                row + r >= 0
+                and col + c >= 0
+                and row + r < len(board)
+                and col + c < len(board[0])
+                and board_state[row + r][col + c] == unopened
+            ):
+                board_state[row + r][col + c] = counts[row + r][col + c]
+                changed.append((row + r, col + c))
+                opened += 1
+                if counts[row + r][col + c] == 0:
+                    stack.append((row + r, col + c))
+    return opened
+
+
 """flag a single tile if it is unflagged and unopened. If flagged, unflag."""
 
 
@@ -79,44 +230,152 @@ def flag_tile(board_state, row, col):
     return board_state
 
 
+"""the unopened tiles a chord on the tile ([row], [col]) opens: every unflagged neighbor
+of a number with as many flagged neighbors as its count, and none for any other tile."""
+
+
+def chord_tiles(board_state, row, col):
+    if board_state[row][col] <= 0:
+        return []
+    neighbors = [
+        (row + r, col + c)
+        for r, c in sorted(coordinates)
+        if 0 <= row + r < len(board_state) and 0 <= col + c < len(board_state[0])
+    ]
+    flags = sum(board_state[r][c] == flaged for r, c in neighbors)
+    if flags != board_state[row][col]:
+        return []
+    return [(r, c) for r, c in neighbors if board_state[r][c] == unopened]
+
+
+"""chord a tile: open every unflagged neighbor of a number whose mines are all flagged,
+the way open_tile opens a single tile."""
+
+
+def chord_tile(board_state, board, row, col, counts=None, regions=None):
+    if counts is None:
+        counts = init_counts(board)
+    for r, c in chord_tiles(board_state, row, col):
+        reveal_tile(board_state, board, r, c, counts, regions)
+    return board_state
+
+
 """Check how many bombs are in the surrounding eight tiles around a particular tile"""
 
 
 def count_surrounding_bombs(board, row, col):
-    count = 0
-    for r, c in coordinates:
-        if (
-            row + r >= 0
-            and col + c >= 0
-            and row + r < len(board)
-            and col + c < len(board[0])
-        ):
-            if board[row + r][col + c] == mine:
-                count += 1
-    return count
+    board = np.asarray(board)
+    window = board[max(row - 1, 0) : row + 2, max(col - 1, 0) : col + 2]
+    return int(np.count_nonzero(window == mine) - (board[row, col] == mine))
 
 
 """check to see if game has been lost, where losing is defined as a mine being opened."""
 
 
 def game_lost(board, board_state):
-    for i in range(len(board)):
-        for j in range(len(board[0])):
-            if board[i][j] == mine and board_state[i][j] >= 0:
-                return True
-    return False
+    return bool(np.any((np.asarray(board) == mine) & (np.asarray(board_state) >= 0)))
 
 
 """check to see if game has been won, where wining is defined as all empty tiles have been opened."""
 
 
 def game_won(board_state, bomb_count):
-    open_tiles = 0
-    for i in range(len(board_state)):
-        for j in range(len(board_state[0])):
-            if board_state[i][j] >= 0:
-                open_tiles += 1
-    return open_tiles == len(board_state) * len(board_state[0]) - bomb_count
+    board_state = np.asarray(board_state)
+    return np.count_nonzero(board_state >= 0) == board_state.size - bomb_count
+
+
+"""A single game of minesweeper. The board is placed on the first open so that the first
+tile is never a mine, and the mines are drawn from [rng]. The game keeps count of the opened safe tiles, the opened mines
+and the flags as moves are made, so checking whether it is won or lost does not need to
+look at the board, and of the tiles that changed, so the AI does not need to either."""
+
+
+class Game(object):
+    def __init__(self, board_size, bomb_count, rng=None):
+        self.board_size = board_size
+        self.bomb_count = bomb_count
+        self.rng = np.random.default_rng(rng)
+        self.board = np.zeros((board_size, board_size), dtype=board_dtype)
+        self.counts = init_counts(self.board)
+        self.regions = None
+        self.board_state = init_board_state(board_size)
+        self.first_move = True
+        self.safe_opened = 0
+        self.mines_opened = 0
+        self.flags = 0
+        self.changed = []
+
+    def open(self, row, col):
+        if self.first_move:
+            self.board = init_board(
+                self.board_size, self.bomb_count, row, col, self.rng
+            )
+            self.counts = init_counts(self.board)
+            self.regions = init_regions(self.board, self.counts)
+            self.first_move = False
+        opened = reveal_tile(
+            self.board_state,
+            self.board,
+            row,
+            col,
+            self.counts,
+            self.regions,
+            self.changed,
+        )
+        # only the clicked tile can be a mine, the cascade stops at numbered tiles
+        if opened and self.board[row][col] == mine:
+            self.mines_opened += 1
+            opened -= 1
+        self.safe_opened += opened
+        return self.board_state
+
+    def flag(self, row, col):
+        before = self.board_state[row][col]
+        flag_tile(self.board_state, row, col)
+        if self.board_state[row][col] == flaged and before != flaged:
+            self.flags += 1
+        elif before == flaged and self.board_state[row][col] != flaged:
+            self.flags -= 1
+        if self.board_state[row][col] != before:
+            self.changed.append((row, col))
+        return self.board_state
+
+    def chord(self, row, col):
+        for r, c in chord_tiles(self.board_state, row, col):
+            self.open(r, c)
+        return self.board_state
+
+    """make the (opp, r, c) moves of [moves] in order, where opp is "open", "flag" or
+    "chord", and stop as soon as the game is over. Returns how many moves were made."""
+
+    def apply(self, moves):
+        applied = 0
+        for opp, r, c in moves:
+            if self.won() or self.lost():
+                break
+            if opp == "open":
+                self.open(r, c)
+            if opp == "flag":
+                self.flag(r, c)
+            if opp == "chord":
+                self.chord(r, c)
+            applied += 1
+        return applied
+
+    """the tiles whose state changed since the last call, as a list of (r, c)."""
+
+    def pop_changed(self):
+        changed, self.changed = self.changed, []
+        return changed
+
+    def lost(self):
+        return self.mines_opened > 0
+
+    def won(self):
+        return (
+            not self.mines_opened
+            and self.safe_opened == self.board_size**2 - self.bomb_count
+        )
 
 
 """print a row of the game board to the console."""
@@ -143,17 +402,67 @@ def print_board(board, board_state):
         print()
 
 
-"""game loop for minesweeper game mode."""
+"""An observer is told about every move of a game played by game_loop and about how the
+game ended. Subclasses override the events they care about. The moves made in one call
+of Game.apply are passed to on_batch together, after all of them, which by default
+hands them to on_move one by one."""
 
 
-def printed_game_loop(
-    mode, bomb_count, board_size, certain_move_model, uncertain_move_strat
+class GameObserver(object):
+    def on_move(self, game, opp, r, c, move_count):
+        pass
+
+    def on_batch(self, game, moves, move_count):
+        first = move_count - len(moves)
+        for i, (opp, r, c) in enumerate(moves):
+            self.on_move(game, opp, r, c, first + i + 1)
+
+    def on_end(self, game, is_win, move_count):
+        pass
+
+
+"""Observer that prints every move and the board after it to the console. The moves of
+a batch are printed together, followed by the board after the last of them."""
+
+
+class ConsoleObserver(GameObserver):
+    def on_move(self, game, opp, r, c, move_count):
+        self.on_batch(game, [(opp, r, c)], move_count)
+
+    def on_batch(self, game, moves, move_count):
+        print()
+        for opp, r, c in moves:
+            print("Move: " + opp + " " + str(r) + " " + str(c))
+        print_board(game.board, game.board_state)
+
+    def on_end(self, game, is_win, move_count):
+        if is_win:
+            print("you won")
+        else:
+            print("you lost")
+
+
+"""game loop for minesweeper game mode. Nothing is rendered, every move is passed on
+to the [observers] instead. [rng] is the numpy Generator, or a seed for one, that both
+the board and the AI draw from, so a seeded game always plays out the same way. With
+[batch] the AI hands over every certain move it has found at once, and they are made
+in a single Game.apply, which plays the same game in fewer loop iterations."""
+
+
+def game_loop(
+    mode,
+    bomb_count,
+    board_size,
+    certain_move_model,
+    uncertain_move_strat,
+    observers=(),
+    rng=None,
+    batch=False,
 ):
-    board = np.zeros((board_size, board_size))
-    board_state = init_board_state(board_size)
+    rng = np.random.default_rng(rng)
+    game = Game(board_size, bomb_count, rng)
     move_count = 0
-    first_move = True
-    while not game_won(board_state, bomb_count) and not game_lost(board, board_state):
+    while not game.won() and not game.lost():
         if mode == "human":
             read = input()
             read_split = read.split()
@@ -169,31 +478,55 @@ def printed_game_loop(
                 if r < 0 or c < 0 or r >= board_size or c >= board_size:
                     print("Out of bounds")
                     continue
-        else:
-            opp, r, c = heuristic_model.ai_heuristic_logic(
-                board_state,
-                first_move,
+            moves = [(opp, r, c)]
+        elif batch:
+            moves = heuristic_model.ai_heuristic_moves(
+                game.board_state,
+                game.first_move,
                 bomb_count,
                 certain_move_model,
                 uncertain_move_strat,
+                rng,
+                game.pop_changed(),
             )
-        if opp == "open":
-            if first_move:
-                board = init_board(board_size, bomb_count, r, c)
-                first_move = False
-            board_state = open_tile(board_state, board, r, c)
-        if opp == "flag":
-            board_state = flag_tile(board_state, r, c)
-        print()
-        move_count += 1
-        print("Move: " + opp + " " + str(r) + " " + str(c))
-        print_board(board, board_state)
-    if game_lost(board, board_state):
-        print("you lost")
-        return False, move_count
-    else:
-        print("you won")
-        return True, move_count
+        else:
+            moves = [
+                heuristic_model.ai_heuristic_logic(
+                    game.board_state,
+                    game.first_move,
+                    bomb_count,
+                    certain_move_model,
+                    uncertain_move_strat,
+                    rng,
+                    game.pop_changed(),
+                )
+            ]
+        applied = game.apply(moves)
+        move_count += applied
+        for observer in observers:
+            observer.on_batch(game, moves[:applied], move_count)
+    is_win = not game.lost()
+    for observer in observers:
+        observer.on_end(game, is_win, move_count)
+    return is_win, move_count
+
+
+"""game loop for minesweeper game mode that prints every move to the console. The AI
+makes its certain moves in batches, and the board is printed once per batch."""
+
+
+def printed_game_loop(
+    mode, bomb_count, board_size, certain_move_model, uncertain_move_strat
+):
+    return game_loop(
+        mode,
+        bomb_count,
+        board_size,
+        certain_move_model,
+        uncertain_move_strat,
+        [ConsoleObserver()],
+        batch=True,
+    )
 
 
 """output the number of wins for a given number of trials"""
@@ -204,22 +537,20 @@ def trials():
     bomb_count = int(input("Enter bomb count: "))
     iterations = int(input("input number of trial iteration: "))
     certain_move_model = int(
-        input("input certain move model: SP_Solver(0), CSP_Solver(1)")
+        input("input certain move model: SP_Solver(0), CSP_Solver(1), tiered(2)")
     )
     uncertain_move_strat = int(
-        input("input uncertain move strategy: random(0), local probability(1)")
+        input(
+            "input uncertain move strategy: random(0), local probability(1), exact probability(2)"
+        )
     )
     count = iterations
 
     start_time = time.time()
-    win = 0
-    while iterations > 0:
-        is_win, _ = printed_game_loop(
-            "ai", bomb_count, board_size, certain_move_model, uncertain_move_strat
-        )
-        if is_win:
-            win += 1
-        iterations -= 1
+    data = parallel_generate_data(
+        board_size, bomb_count, certain_move_model, uncertain_move_strat, iterations
+    )
+    win = int(np.sum(data["wins"]))
     end_time = time.time()
     print("Trials: " + str(count))
     print("Wins: " + str(win))
@@ -227,33 +558,196 @@ def trials():
     print("elapsed time: " + str(end_time - start_time))
 
 
+# the record of every game played by generate_data
+data_dtype = [("wins", "i4"), ("times", "f8"), ("move_counts", "i4")]
+
+
+"""the configuration of a run of generate_data, as stored in the header of its results."""
+
+
+def run_config(board_size, bomb_count, certain_move_model, uncertain_move_strat, seed):
+    return {
+        "board_size": board_size,
+        "bomb_count": bomb_count,
+        "certain_move_model": certain_move_model,
+        "uncertain_move_strat": uncertain_move_strat,
+        "seed": seed,
+    }
+
+
+"""open the result sink of a run at [path], or return None when there is no [path]. A run
+already stored there is resumed, and its seed is used when [seed] is None."""
+
+
+def open_sink(
+    path, board_size, bomb_count, certain_move_model, uncertain_move_strat, seed
+):
+    if path is None:
+        return None, np.random.SeedSequence(seed).entropy
+    header = result_sink.read_header(path)
+    if seed is None and header is not None:
+        seed = header["seed"]
+    seed = np.random.SeedSequence(seed).entropy
+    config = run_config(
+        board_size, bomb_count, certain_move_model, uncertain_move_strat, seed
+    )
+    return result_sink.ResultSink(path, config, data_dtype), seed
+
+
+"""play [iterations] AI games and return the wins, the time elapsed after each game and
+the move counts as a structured array. Game i is played with game_seed([seed], i). When
+[path] is given every game is streamed to a ResultSink there, and a run interrupted
+earlier picks up after its last stored game. The solver cache is loaded from
+[cache_path] before the games and saved there after them."""
+
+
 def generate_data(
-    board_size, bomb_count, certain_move_model, uncertain_move_strat, iterations
+    board_size,
+    bomb_count,
+    certain_move_model,
+    uncertain_move_strat,
+    iterations,
+    seed=None,
+    path=None,
+    cache_path=None,
 ):
+    sink, seed = open_sink(
+        path, board_size, bomb_count, certain_move_model, uncertain_move_strat, seed
+    )
+    if cache_path is not None:
+        heuristic_model.component_cache.load(cache_path)
+    first_game = 0
+    start_time = time.time()
+    if sink is not None and sink.last() is not None:
+        first_game = sink.completed
+        start_time -= sink.last()["times"]
     wins_arr = []
     times_arr = []
     move_count_arr = []
-    start_time = time.time()
-    while iterations > 0:
-        with contextlib.redirect_stdout(io.StringIO()):
-            is_win, move_count = printed_game_loop(
-                "ai", bomb_count, board_size, certain_move_model, uncertain_move_strat
-            )
+    for game in range(first_game, iterations):
+        is_win, move_count = game_loop(
+            "ai",
+            bomb_count,
+            board_size,
+            certain_move_model,
+            uncertain_move_strat,
+            rng=game_seed(seed, game),
+            batch=True,
+        )
         if is_win:
             wins_arr.append(1)
         else:
             wins_arr.append(0)
         times_arr.append(time.time() - start_time)
         move_count_arr.append(move_count)
-        iterations -= 1
-
+        if sink is not None:
+            sink.append((wins_arr[-1], times_arr[-1], move_count_arr[-1]))
+
+    if cache_path is not None:
+        heuristic_model.component_cache.save(cache_path)
+    if sink is not None:
+        sink.close()
+        return result_sink.load_results(path, data_dtype)
     data = np.array(
         list(zip(wins_arr, times_arr, move_count_arr)),
-        dtype=[("wins", "i4"), ("times", "f8"), ("move_counts", "i4")],
+        dtype=data_dtype,
     )
     return data
 
 
+"""play the games [first_game, first_game + game_count) of a run seeded with [seed] in a
+worker process of parallel_generate_data. Returns the wins, the time each game took and
+the move counts as a structured array."""
+
+
+def play_games(
+    board_size,
+    bomb_count,
+    certain_move_model,
+    uncertain_move_strat,
+    seed,
+    first_game,
+    game_count,
+):
+    data = np.zeros(game_count, dtype=data_dtype)
+    for i in range(game_count):
+        start_time = time.time()
+        is_win, move_count = game_loop(
+            "ai",
+            bomb_count,
+            board_size,
+            certain_move_model,
+            uncertain_move_strat,
+            rng=game_seed(seed, first_game + i),
+            batch=True,
+        )
+        data[i] = (is_win, time.time() - start_time, move_count)
+    return data
+
+
+"""generate_data spread over a pool of [workers] processes, which defaults to one per core.
+Game i is played with game_seed([seed], i) the same as in generate_data, so a run gives
+the same games no matter how many workers play it, and the games are handed out in
+chunks of [chunk_size]. times holds the running total of the time spent in games, the
+same as generate_data reports for a run played on one core. [path] streams and resumes
+the run the same way generate_data does, and every worker starts from the solver cache
+saved at [cache_path], which is only read."""
+
+
+def parallel_generate_data(
+    board_size,
+    bomb_count,
+    certain_move_model,
+    uncertain_move_strat,
+    iterations,
+    workers=None,
+    seed=None,
+    chunk_size=10,
+    path=None,
+    cache_path=None,
+):
+    sink, seed = open_sink(
+        path, board_size, bomb_count, certain_move_model, uncertain_move_strat, seed
+    )
+    first_game = 0
+    elapsed = 0
+    if sink is not None and sink.last() is not None:
+        first_game = sink.completed
+        elapsed = sink.last()["times"]
+    first_games = list(range(first_game, iterations, chunk_size))
+    chunk_sizes = [min(chunk_size, iterations - first) for first in first_games]
+    data = [np.zeros(0, dtype=data_dtype)]
+    initializer, initargs = None, ()
+    if cache_path is not None:
+        initializer, initargs = heuristic_model.component_cache.load, (cache_path,)
+    with ProcessPoolExecutor(
+        workers, initializer=initializer, initargs=initargs
+    ) as executor:
+        chunks = executor.map(
+            play_games,
+            [board_size] * len(first_games),
+            [bomb_count] * len(first_games),
+            [certain_move_model] * len(first_games),
+            [uncertain_move_strat] * len(first_games),
+            [seed] * len(first_games),
+            first_games,
+            chunk_sizes,
+        )
+        for chunk in chunks:
+            chunk["times"] = elapsed + np.cumsum(chunk["times"])
+            elapsed = chunk["times"][-1]
+            if sink is not None:
+                for record in chunk:
+                    sink.append(record)
+                sink.flush()
+            data.append(chunk)
+
+    if sink is not None:
+        sink.close()
+        return result_sink.load_results(path, data_dtype)
+    return np.concatenate(data)
+
+
 def main():
     trials()
 
@@ -0,0 +1,108 @@
+import json
+import os
+import numpy as np
+
+# the file in a run directory that describes the configuration of the run
+header_name = "header.json"
+
+"""Streams the per-game records of a run to the directory [path]. The directory holds a
+header describing the configuration of the run, and the records as .npy files of up to
+[chunk_size] games each, named after the first game they hold. A chunk is written to a
+temporary file and renamed once complete, so a crash loses at most the games that were
+not written yet. Opening a directory that already holds a run resumes it: [config] must
+match the stored header, and completed is the number of games already stored."""
+
+
+class ResultSink(object):
+    def __init__(self, path, config, dtype, chunk_size=10):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.pending = []
+        header = read_header(path)
+        if header is None:
+            os.makedirs(path, exist_ok=True)
+            self.config = dict(config)
+            write_json(os.path.join(path, header_name), self.config)
+        else:
+            for key, value in config.items():
+                if header.get(key) != value:
+                    raise ValueError(
+                        f"run at {path} has {key} = {header.get(key)}, not {value}"
+                    )
+            self.config = header
+        self.written = sum(len(chunk) for chunk in iter_results(path))
+
+    @property
+    def completed(self):
+        return self.written + len(self.pending)
+
+    """the record of the last game stored, or None if no game has been stored yet."""
+
+    def last(self):
+        if self.pending:
+            return np.array(self.pending[-1], dtype=self.dtype)
+        chunks = list(iter_results(self.path))
+        if not chunks or not len(chunks[-1]):
+            return None
+        return chunks[-1][-1]
+
+    def append(self, record):
+        self.pending.append(tuple(record))
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        chunk_path = os.path.join(self.path, "chunk_%08d.npy" % self.written)
+        with open(chunk_path + ".tmp", "wb") as f:
+            np.save(f, np.array(self.pending, dtype=self.dtype))
+        os.replace(chunk_path + ".tmp", chunk_path)
+        self.written += len(self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+"""the header of the run stored at [path], or None if there is no run there."""
+
+
+def read_header(path):
+    header_path = os.path.join(path, header_name)
+    if not os.path.exists(header_path):
+        return None
+    with open(header_path) as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+"""yield the chunks of the run stored at [path] in game order. Each chunk is memory mapped,
+so records are only read from disk when they are used."""
+
+
+def iter_results(path):
+    if not os.path.isdir(path):
+        return
+    for name in sorted(os.listdir(path)):
+        if name.startswith("chunk_") and name.endswith(".npy"):
+            yield np.load(os.path.join(path, name), mmap_mode="r")
+
+
+"""load every record of the run stored at [path] into one structured array."""
+
+
+def load_results(path, dtype):
+    return np.concatenate(list(iter_results(path)) + [np.zeros(0, dtype=dtype)])
@@ -1,8 +1,18 @@
 import heuristic_model
 import minesweeper
+import batch_minesweeper
+import result_sink
+import benchmarks
 from heuristic_model import SP_solver, CSP_solver, ai_heuristic_logic
 import numpy as np
 import unittest
+import io
+import contextlib
+import tempfile
+import os
+import sys
+import time
+import threading
 from sympy import *
 from collections import deque
 
@@ -378,5 +388,789 @@ class TestCountSurroundingBombsCorner(unittest.TestCase):
             actual_val, expected_val, f"expected {expected_val} but got {actual_val}"
         )
 
+
+# This test case checks that the precomputed neighbor counts of init_counts agree
+# with count_surrounding_bombs for every tile of a random board.
+class TestInitCounts(unittest.TestCase):
+    def test_init_counts_matches_count_surrounding_bombs(self):
+        board = minesweeper.init_board(10, 30, 0, 0)
+        counts = minesweeper.init_counts(board)
+        for r in range(10):
+            for c in range(10):
+                self.assertEqual(
+                    counts[r][c],
+                    minesweeper.count_surrounding_bombs(board, r, c),
+                    f"incorrect count at ({r}, {c})",
+                )
+
+
+# This test case checks that revealing whole zero regions through init_regions opens
+# exactly the tiles the tile by tile cascade opens, including when flags block it.
+class TestInitRegions(unittest.TestCase):
+    def test_open_tile_regions_matches_cascade(self):
+        for _ in range(50):
+            board = minesweeper.init_board(12, 15, 0, 0)
+            counts = minesweeper.init_counts(board)
+            regions = minesweeper.init_regions(board, counts)
+            expected_val = minesweeper.init_board_state(12)
+            actual_val = minesweeper.init_board_state(12)
+            minesweeper.flag_tile(expected_val, 6, 6)
+            minesweeper.flag_tile(actual_val, 6, 6)
+            for r, c in [(0, 0), (11, 11), (0, 11), (11, 0)]:
+                minesweeper.open_tile(expected_val, board, r, c, counts)
+                minesweeper.open_tile(actual_val, board, r, c, counts, regions)
+            self.assertTrue(
+                (actual_val == expected_val).all(),
+                f"expected {expected_val} but got {actual_val}",
+            )
+
+    def test_open_tile_large_board(self):
+        board = init_test_board(500, [(499, 499)])
+        counts = minesweeper.init_counts(board)
+        regions = minesweeper.init_regions(board, counts)
+        board_state = minesweeper.init_board_state(500)
+        actual_val = minesweeper.open_tile(board_state, board, 0, 0, counts, regions)
+        self.assertEqual(np.count_nonzero(actual_val == -1), 1)
+        self.assertEqual(actual_val[498][498], 1)
+
+
+# This test case plays AI games through the Game object and checks after every move
+# that its incremental won and lost checks agree with the full board scans.
+class TestGame(unittest.TestCase):
+    def test_game_counters_match_board_scans(self):
+        for _ in range(20):
+            game = minesweeper.Game(9, 10)
+            while not game.won() and not game.lost():
+                opp, r, c = ai_heuristic_logic(
+                    game.board_state, game.first_move, 10, 0, 1
+                )
+                if opp == "open":
+                    game.open(r, c)
+                else:
+                    game.flag(r, c)
+                self.assertEqual(
+                    game.lost(), minesweeper.game_lost(game.board, game.board_state)
+                )
+                if not game.lost():
+                    self.assertEqual(
+                        game.won(), minesweeper.game_won(game.board_state, 10)
+                    )
+                self.assertEqual(game.flags, np.count_nonzero(game.board_state == -2))
+
+
+# This test case plays a batch of games with random opens and flags and checks that
+# every board state and win or loss mask matches the single game engine on the same
+# boards.
+class TestBatchGame(unittest.TestCase):
+    def test_batch_game_matches_single_games(self):
+        rng = np.random.default_rng(0)
+        games = batch_minesweeper.BatchGame(100, 9, 10, rng)
+        board_states = [minesweeper.init_board_state(9) for _ in range(100)]
+        while not games.done().all():
+            rows, cols = games.random_moves()
+            playing = np.flatnonzero(~games.done())
+            if not games.first_move.any() and rng.random() < 0.3:
+                games.flag(rows, cols)
+                for g in playing:
+                    minesweeper.flag_tile(board_states[g], rows[g], cols[g])
+            else:
+                games.open(rows, cols)
+                for g in playing:
+                    minesweeper.open_tile(
+                        board_states[g], games.boards[g], rows[g], cols[g]
+                    )
+            for g in range(100):
+                self.assertTrue((games.board_states[g] == board_states[g]).all())
+                self.assertEqual(
+                    games.lost()[g],
+                    minesweeper.game_lost(games.boards[g], board_states[g]),
+                )
+        self.assertTrue((games.won() == ~games.lost()).all())
+
+
+# This test case checks the compact board representations: boards are one byte per
+# tile, board states are int8, and a packed board unpacks to the same board.
+class TestCompactBoard(unittest.TestCase):
+    def test_compact_dtypes(self):
+        board = minesweeper.init_board(16, 40, 3, 3)
+        board_state = minesweeper.init_board_state(16)
+        self.assertEqual(board.dtype, np.uint8)
+        self.assertEqual(board_state.dtype, np.int8)
+
+    def test_pack_board(self):
+        board = minesweeper.init_board(22, 99, 0, 0)
+        packed_board = minesweeper.pack_board(board)
+        self.assertEqual(packed_board.nbytes, 61)
+        self.assertTrue((minesweeper.unpack_board(packed_board, 22) == board).all())
+
+
+# This test case checks that game_loop renders nothing on its own and reports every
+# move and the end of the game to its observers, that batched moves play the same game,
+# and that a chord opens the unflagged neighbors of a number with all its mines flagged.
+class TestGameLoop(unittest.TestCase):
+    def test_game_loop_observers(self):
+        class RecordingObserver(minesweeper.GameObserver):
+            def __init__(self):
+                self.moves = []
+                self.result = None
+
+            def on_move(self, game, opp, r, c, move_count):
+                self.moves.append((opp, r, c))
+
+            def on_end(self, game, is_win, move_count):
+                self.result = (is_win, move_count)
+
+        observer = RecordingObserver()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            is_win, move_count = minesweeper.game_loop(
+                "ai", 10, 9, 0, 1, observers=[observer]
+            )
+        self.assertEqual(output.getvalue(), "")
+        self.assertEqual(len(observer.moves), move_count)
+        self.assertEqual(observer.result, (is_win, move_count))
+
+    def test_game_loop_batch(self):
+        for certain_move_model in range(3):
+            for seed in range(5):
+                expected_val = minesweeper.game_loop(
+                    "ai", 40, 16, certain_move_model, 1, rng=seed
+                )
+                actual_val = minesweeper.game_loop(
+                    "ai", 40, 16, certain_move_model, 1, rng=seed, batch=True
+                )
+                self.assertEqual(actual_val, expected_val)
+
+    def test_chord(self):
+        m_indices = [(0, 0)]
+        board = init_test_board(3, m_indices)
+        board_state = init_test_board_state(3, [(0, 0)], [(1, 1)], board)
+        minesweeper.chord_tile(board_state, board, 1, 1)
+        o_indices = [(r, c) for r in range(3) for c in range(3) if (r, c) != (0, 0)]
+        expected_val = init_test_board_state(3, [(0, 0)], o_indices, board)
+        self.assertTrue((board_state == expected_val).all())
+
+        # a number without all its mines flagged opens nothing
+        board_state = init_test_board_state(3, [], [(1, 1)], board)
+        minesweeper.chord_tile(board_state, board, 1, 1)
+        self.assertEqual(np.count_nonzero(board_state >= 0), 1)
+
+
+# This test case checks that parallel_generate_data returns one record per game and
+# plays the same games for a seed no matter how many workers share them.
+class TestParallelGenerateData(unittest.TestCase):
+    def test_parallel_generate_data_deterministic(self):
+        data = minesweeper.parallel_generate_data(9, 10, 0, 1, 25, workers=1, seed=3)
+        other = minesweeper.parallel_generate_data(9, 10, 0, 1, 25, workers=2, seed=3)
+        self.assertEqual(data.dtype, np.dtype(minesweeper.data_dtype))
+        self.assertEqual(len(data), 25)
+        self.assertTrue((data["wins"] == other["wins"]).all())
+        self.assertTrue((data["move_counts"] == other["move_counts"]).all())
+        self.assertTrue((np.diff(data["times"]) >= 0).all())
+
+
+# This test case checks that a seeded run always plays the same games, and that a
+# single game of it can be replayed on its own from its game seed, also when exact
+# probability guesses sample a set number of draws.
+class TestSeededGames(unittest.TestCase):
+    def test_generate_data_seeded(self):
+        data = minesweeper.generate_data(9, 10, 0, 1, 20, seed=11)
+        other = minesweeper.generate_data(9, 10, 0, 1, 20, seed=11)
+        self.assertTrue((data["move_counts"] == other["move_counts"]).all())
+        is_win, move_count = minesweeper.game_loop(
+            "ai", 10, 9, 0, 1, rng=minesweeper.game_seed(11, 5)
+        )
+        self.assertEqual(
+            (is_win, move_count), (data["wins"][5], data["move_counts"][5])
+        )
+
+    def test_sampled_game_seeded(self):
+        exact_component_size = heuristic_model.exact_component_size
+        sample_draws = heuristic_model.sample_draws
+        heuristic_model.exact_component_size = 4
+        heuristic_model.sample_draws = 20
+        try:
+            results = [
+                minesweeper.game_loop(
+                    "ai", 99, 22, 1, 2, rng=minesweeper.game_seed(5, 1)
+                )
+                for _ in range(2)
+            ]
+        finally:
+            heuristic_model.exact_component_size = exact_component_size
+            heuristic_model.sample_draws = sample_draws
+        self.assertEqual(results[0], results[1])
+
+    def test_init_board_seeded(self):
+        board = minesweeper.init_board(16, 40, 8, 8, rng=4)
+        self.assertTrue((board == minesweeper.init_board(16, 40, 8, 8, rng=4)).all())
+        self.assertEqual(board[8][8], 0)
+        self.assertEqual(np.count_nonzero(board), 40)
+
+
+# This test case checks that a run streamed to disk can be stopped and resumed, and
+# that the resumed run stores the same games as a run played in one go.
+class TestResultSink(unittest.TestCase):
+    def test_generate_data_resume(self):
+        expected_val = minesweeper.generate_data(9, 10, 0, 1, 25, seed=2)
+        with tempfile.TemporaryDirectory() as path:
+            path = os.path.join(path, "run")
+            minesweeper.generate_data(9, 10, 0, 1, 13, seed=2, path=path)
+            self.assertEqual(result_sink.read_header(path)["seed"], 2)
+            actual_val = minesweeper.generate_data(9, 10, 0, 1, 25, path=path)
+            self.assertEqual(len(actual_val), 25)
+            self.assertTrue(
+                (actual_val["move_counts"] == expected_val["move_counts"]).all()
+            )
+            self.assertTrue((np.diff(actual_val["times"]) >= 0).all())
+            with self.assertRaises(ValueError):
+                minesweeper.generate_data(9, 10, 1, 1, 25, path=path)
+
+    def test_parallel_generate_data_resume(self):
+        expected_val = minesweeper.parallel_generate_data(9, 10, 0, 1, 30, seed=4)
+        with tempfile.TemporaryDirectory() as path:
+            minesweeper.parallel_generate_data(9, 10, 0, 1, 10, seed=4, path=path)
+            actual_val = minesweeper.parallel_generate_data(
+                9, 10, 0, 1, 30, seed=4, path=path
+            )
+            self.assertTrue(
+                (actual_val["move_counts"] == expected_val["move_counts"]).all()
+            )
+            chunks = list(result_sink.iter_results(path))
+            self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 10])
+
+
+# This test case checks that only benchmarks slower than the baseline by more than the
+# tolerance are reported as regressions.
+class TestFindRegressions(unittest.TestCase):
+    def test_find_regressions(self):
+        baseline = {"expert/SP_solver": 1.0, "expert/to_matrix": 1.0}
+        results = {"expert/SP_solver": 1.4, "expert/to_matrix": 2.0, "new": 5.0}
+        actual_val = benchmarks.find_regressions(results, baseline, tolerance=1.5)
+        self.assertEqual(actual_val, {"expert/to_matrix": (1.0, 2.0)})
+
+
+# This test case checks that frontier_constraints keeps only the rows of numbered
+# frontier tiles and the columns of the unopened tiles next to them.
+class TestFrontierConstraints(unittest.TestCase):
+    def test_frontier_constraints_all_but_1(self):
+        m_indices = [(0, 0)]
+        board = init_test_board(2, m_indices)
+        board_state = init_test_board_state(2, [], [(0, 1), (1, 0), (1, 1)], board)
+        actual_val, tiles = heuristic_model.frontier_constraints(board_state)
+        expected_val = np.array([[1, 1], [1, 1], [1, 1]])
+        self.assertTrue(
+            (actual_val == expected_val).all(),
+            f"expected {expected_val} but got {actual_val}",
+        )
+        self.assertEqual(tiles.tolist(), [[0, 0]])
+
+    def test_frontier_constraints_flagged(self):
+        m_indices = [(0, 0), (0, 2)]
+        board = init_test_board(3, m_indices)
+        board_state = init_test_board_state(3, [(0, 0)], [(1, 1), (1, 2)], board)
+        actual_val, tiles = heuristic_model.frontier_constraints(board_state)
+        expected_val = np.array([[1, 1, 1, 1, 1, 1, 1], [1, 1, 0, 0, 1, 1, 1]])
+        self.assertTrue(
+            (actual_val == expected_val).all(),
+            f"expected {expected_val} but got {actual_val}",
+        )
+        expected_tiles = [[0, 1], [0, 2], [1, 0], [2, 0], [2, 1], [2, 2]]
+        self.assertEqual(tiles.tolist(), expected_tiles)
+
+
+# This test case checks the exact integer row reduction, and that CSP_solver finds the
+# moves of a 1-2-1 pattern, which only the reduced rows give.
+class TestRref(unittest.TestCase):
+    def test_rref(self):
+        board_rep = np.array([[1, 1, 0, 1], [0, 1, 1, 1], [1, 1, 1, 1]])
+        actual_val = heuristic_model.rref(board_rep)
+        expected_val = np.array([[1, 0, 0, 0], [0, 1, 0, 1], [0, 0, 1, 0]])
+        self.assertTrue(
+            (actual_val == expected_val).all(),
+            f"expected {expected_val} but got {actual_val}",
+        )
+
+    def test_CSP_solver_1_2_1(self):
+        m_indices = [(0, 0), (0, 2)]
+        board = init_test_board(3, m_indices)
+        o_indices = [(1, 0), (1, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+        board_state = init_test_board_state(3, [], o_indices, board)
+        heuristic_model.queue.clear()
+        heuristic_model.mines.clear()
+        heuristic_model.empty.clear()
+        heuristic_model.CSP_solver(board_state)
+        actual_val = set(heuristic_model.queue)
+        expected_val = {("flag", 0, 0), ("open", 0, 1), ("flag", 0, 2)}
+        self.assertEqual(actual_val, expected_val)
+
+
+# This test case checks that pattern_solver finds the moves of a 1-2-1 and a 1-2-2-1
+# pattern, that a rotated pattern is looked up under the same canonical code, and that
+# looking up the neighborhoods of changed constraints finds the moves of the whole board.
+class TestPatternSolver(unittest.TestCase):
+    def test_pattern_solver_1_2_1(self):
+        m_indices = [(0, 0), (0, 2)]
+        board = init_test_board(3, m_indices)
+        o_indices = [(1, 0), (1, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+        board_state = init_test_board_state(3, [], o_indices, board)
+        heuristic_model.queue.clear()
+        heuristic_model.mines.clear()
+        heuristic_model.empty.clear()
+        heuristic_model.pattern_table.clear()
+        heuristic_model.pattern_solver(board_state)
+        actual_val = set(heuristic_model.queue)
+        expected_val = {("flag", 0, 0), ("open", 0, 1), ("flag", 0, 2)}
+        self.assertEqual(actual_val, expected_val)
+
+        keys = set(heuristic_model.pattern_table)
+        heuristic_model.queue.clear()
+        heuristic_model.mines.clear()
+        heuristic_model.empty.clear()
+        heuristic_model.pattern_solver(np.rot90(board_state))
+        actual_val = set(heuristic_model.queue)
+        expected_val = {("flag", 2, 0), ("open", 1, 0), ("flag", 0, 0)}
+        self.assertEqual(actual_val, expected_val)
+        self.assertEqual(set(heuristic_model.pattern_table), keys)
+
+    def test_pattern_solver_1_2_2_1(self):
+        m_indices = [(0, 1), (0, 2)]
+        board = init_test_board(4, m_indices)
+        o_indices = [(r, c) for r in range(1, 4) for c in range(4)]
+        board_state = init_test_board_state(4, [], o_indices, board)
+        heuristic_model.queue.clear()
+        heuristic_model.mines.clear()
+        heuristic_model.empty.clear()
+        actual_val = set(heuristic_model.pattern_solver(board_state))
+        self.assertEqual(actual_val, {("flag", 0, 1), ("flag", 0, 2)})
+
+        # with the mines flagged, the 1s have their mine and the ends are safe
+        board_state[0][1] = board_state[0][2] = -2
+        actual_val = set(heuristic_model.pattern_solver(board_state))
+        self.assertEqual(actual_val, {("open", 0, 0), ("open", 0, 3)})
+
+    def test_pattern_solver_dirty_constraints(self):
+        board_state = np.array([[1, -1], [0, 0]])
+        actual_val = heuristic_model.pattern_solver(
+            board_state,
+            heuristic_model.ConstraintState(),
+            heuristic_model.HeuristicSolver(),
+        )
+        self.assertEqual(actual_val, [("flag", 0, 1)])
+
+        rng = np.random.default_rng(0)
+        for seed in range(50):
+            game = minesweeper.Game(16, 40, rng=seed)
+            game.open(8, 8)
+            for _ in range(int(rng.integers(0, 30))):
+                r, c = heuristic_model.random_move(game.board_state, rng)[1:]
+                if game.board[r][c] == minesweeper.mine:
+                    game.flag(r, c)
+                else:
+                    game.open(r, c)
+            expected_val = heuristic_model.pattern_solver(
+                game.board_state, None, heuristic_model.HeuristicSolver()
+            )
+            actual_val = heuristic_model.pattern_solver(
+                game.board_state,
+                heuristic_model.ConstraintState(),
+                heuristic_model.HeuristicSolver(),
+            )
+            self.assertEqual(actual_val, expected_val)
+
+
+# This test case checks that the constraints kept up to date move by move match the ones
+# frontier_constraints builds from the whole board, both when the changed tiles are found
+# by comparing boards and when the game reports them, and that an incremental SP_solver
+# only checks the constraints that changed, propagating the tiles it finds, and finds the
+# moves of a whole board scan.
+class TestConstraintState(unittest.TestCase):
+    def test_update_matches_frontier_constraints(self):
+        constraint_state = heuristic_model.ConstraintState()
+        changed_state = heuristic_model.ConstraintState()
+        game = minesweeper.Game(9, 10, rng=np.random.default_rng(3))
+        rng = np.random.default_rng(4)
+        game.open(4, 4)
+        while not game.lost() and not game.won():
+            constraint_state.update(game.board_state)
+            changed_state.update(game.board_state, game.pop_changed())
+            expected_rep, expected_tiles = heuristic_model.frontier_constraints(
+                game.board_state
+            )
+            for state in (constraint_state, changed_state):
+                actual_rep, actual_tiles = state.matrix()
+                self.assertTrue(np.array_equal(actual_rep, expected_rep))
+                self.assertTrue(np.array_equal(actual_tiles, expected_tiles))
+            self.assertTrue(np.array_equal(changed_state.board_state, game.board_state))
+            r, c = heuristic_model.random_move(game.board_state, rng)[1:]
+            if game.board[r][c] == minesweeper.mine:
+                game.flag(r, c)
+            else:
+                game.open(r, c)
+
+    def test_SP_solver_dirty_constraints(self):
+        m_indices = [(0, 0)]
+        board = init_test_board(3, m_indices)
+        o_indices = [(0, 2), (1, 0), (1, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+        board_state = init_test_board_state(3, [], o_indices, board)
+        constraint_state = heuristic_model.ConstraintState()
+        heuristic_model.queue.clear()
+        heuristic_model.mines.clear()
+        heuristic_model.empty.clear()
+        heuristic_model.SP_solver(board_state, constraint_state)
+        self.assertEqual(len(heuristic_model.queue), 0)
+        self.assertEqual(constraint_state.dirty, set())
+
+        board_state[0][1] = 1
+        heuristic_model.SP_solver(board_state, constraint_state)
+        self.assertEqual(set(heuristic_model.queue), {("flag", 0, 0)})
+
+    def test_SP_solver_propagates(self):
+        # the 1 at (1, 0) has a single unopened tile, and once it is a mine the 1 at
+        # (1, 1) makes (0, 2) safe and the 1 at (1, 2) then makes (0, 3) a mine, which
+        # a whole board scan only finds moves later
+        board_state = np.array([[-1, 1, -1, -1], [1, 1, 1, 1], [0, 0, 0, 0]])
+        constraint_state = heuristic_model.ConstraintState()
+        heuristic_model.queue.clear()
+        heuristic_model.mines.clear()
+        heuristic_model.empty.clear()
+        SP_solver(board_state, constraint_state)
+        expected_val = {("flag", 0, 0), ("open", 0, 2), ("flag", 0, 3)}
+        self.assertEqual(set(heuristic_model.queue), expected_val)
+
+        heuristic_model.queue.clear()
+        heuristic_model.mines.clear()
+        heuristic_model.empty.clear()
+        SP_solver(board_state)
+        self.assertEqual(set(heuristic_model.queue), {("flag", 0, 0)})
+
+    def test_SP_solver_matches_dirty_constraints(self):
+        constraint_state = heuristic_model.ConstraintState()
+        game = minesweeper.Game(9, 10, rng=np.random.default_rng(5))
+        rng = np.random.default_rng(6)
+        game.open(4, 4)
+        while not game.lost() and not game.won():
+            heuristic_model.queue.clear()
+            heuristic_model.mines.clear()
+            heuristic_model.empty.clear()
+            SP_solver(game.board_state)
+            actual_val = set(heuristic_model.queue)
+            heuristic_model.queue.clear()
+            heuristic_model.mines.clear()
+            heuristic_model.empty.clear()
+            constraint_state.clear()
+            SP_solver(game.board_state, constraint_state)
+            expected_val = set(heuristic_model.queue)
+            self.assertLessEqual(actual_val, expected_val)
+            for opp, r, c in expected_val:
+                self.assertEqual(game.board[r][c] == minesweeper.mine, opp == "flag")
+            r, c = heuristic_model.random_move(game.board_state, rng)[1:]
+            if game.board[r][c] == minesweeper.mine:
+                game.flag(r, c)
+            else:
+                game.open(r, c)
+
+
+# This test case checks that the frontier splits into components that share no unknown
+# tiles, and that CSP_solver solves only the components with a changed constraint.
+class TestFrontierComponents(unittest.TestCase):
+    def test_components(self):
+        board_state = np.array(
+            [
+                [-1, 1, 0, 1, -1],
+                [-1, 1, 0, 1, -1],
+                [-1, 1, 0, 1, -1],
+            ]
+        )
+        constraint_state = heuristic_model.ConstraintState()
+        constraint_state.update(board_state)
+        actual_val = constraint_state.components()
+        expected_val = [[(0, 1), (1, 1), (2, 1)], [(0, 3), (1, 3), (2, 3)]]
+        self.assertEqual(actual_val, expected_val)
+
+    def test_CSP_solver_skips_unchanged_components(self):
+        m_indices = [(0, 0), (0, 2)]
+        board = init_test_board(3, m_indices)
+        o_indices = [(1, 0), (1, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
+        board_state = init_test_board_state(3, [], o_indices, board)
+        constraint_state = heuristic_model.ConstraintState()
+        heuristic_model.queue.clear()
+        heuristic_model.mines.clear()
+        heuristic_model.empty.clear()
+        heuristic_model.CSP_solver(board_state, constraint_state)
+        key = constraint_state.key(constraint_state.components()[0])
+        self.assertEqual(
+            set(heuristic_model.component_cache.get(key, "moves")),
+            {("flag", 0, 0), ("open", 0, 1), ("flag", 0, 2)},
+        )
+
+        heuristic_model.queue.clear()
+        heuristic_model.mines.clear()
+        heuristic_model.empty.clear()
+        heuristic_model.CSP_solver(board_state, constraint_state)
+        self.assertEqual(len(heuristic_model.queue), 0)
+
+
+# This test case checks that a component and its rotated, reflected and moved copies
+# share one cache entry, that each gets the result in its own tiles back, that the least
+# recently used result is dropped first, that threads can share a cache, and that saved
+# results load back the same.
+class TestSolverCache(unittest.TestCase):
+    def test_canonical_component(self):
+        key = ((((0, 0), (0, 1)), 1), (((0, 1), (0, 2)), 1))
+        moved = ((((5, 7), (6, 7)), 1), (((4, 7), (5, 7)), 1))
+        cache = heuristic_model.SolverCache()
+        cache.put(key, "moves", [("flag", 0, 1), ("open", 0, 2)])
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(
+            set(cache.get(moved, "moves")), {("flag", 5, 7), ("open", 4, 7)}
+        )
+        self.assertIsNone(cache.get(moved, "probabilities"))
+
+        expected_val = heuristic_model.enumerate_component(moved)
+        cache.put(key, "probabilities", heuristic_model.enumerate_component(key))
+        self.assertEqual(cache.get(moved, "probabilities"), expected_val)
+
+    def test_lru_eviction(self):
+        keys = [((((0, 0), (0, i)), 1),) for i in range(1, 4)]
+        cache = heuristic_model.SolverCache(size=2)
+        cache.put(keys[0], "moves", [])
+        cache.put(keys[1], "moves", [])
+        cache.get(keys[0], "moves")
+        cache.put(keys[2], "moves", [])
+        self.assertIsNotNone(cache.get(keys[0], "moves"))
+        self.assertIsNone(cache.get(keys[1], "moves"))
+
+    def test_threads(self):
+        keys = [((((0, 0), (0, i)), 1),) for i in range(1, 9)]
+        cache = heuristic_model.SolverCache(size=2)
+        errors = []
+
+        def use(key):
+            try:
+                for _ in range(500):
+                    cache.put(key, "moves", [("open", 0, 0)])
+                    cache.get(key, "moves")
+            except Exception as error:
+                errors.append(error)
+
+        # switch threads as often as possible, so they interleave inside get and put
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=use, args=(key,)) for key in keys]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(cache), 2)
+
+    def test_save_load(self):
+        key = ((((0, 0), (0, 1), (1, 1)), 1), (((1, 1), (2, 1)), 1))
+        cache = heuristic_model.SolverCache()
+        cache.put(key, "moves", [("open", 0, 0)])
+        cache.put(key, "probabilities", heuristic_model.enumerate_component(key))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.json")
+            cache.save(path)
+            other = heuristic_model.SolverCache()
+            other.load(path)
+        self.assertEqual(other.entries, cache.entries)
+        self.assertEqual(
+            other.get(key, "probabilities"), cache.get(key, "probabilities")
+        )
+
+
+# This test case checks the exact mine probabilities of a corner with one mine around it,
+# where the frontier holds exactly one mine and any other mine is off the frontier, and
+# that sampling with a number of draws gives the same estimate every time.
+class TestMineProbabilities(unittest.TestCase):
+    def test_mine_probabilities(self):
+        board_state = minesweeper.init_board_state(3)
+        board_state[0][0] = 1
+        actual_val = heuristic_model.mine_probabilities(board_state, 2)
+        expected_val = np.full((3, 3), 1 / 5)
+        expected_val[0][0] = np.nan
+        expected_val[0][1] = expected_val[1][0] = expected_val[1][1] = 1 / 3
+        self.assertTrue(np.allclose(actual_val, expected_val, equal_nan=True))
+
+    def test_select_tile_with_lowest_exact_probability(self):
+        board_state = minesweeper.init_board_state(3)
+        board_state[0][0] = 1
+        r, c = heuristic_model.select_tile_with_lowest_exact_probability(
+            board_state, 2, np.random.default_rng(0)
+        )
+        self.assertNotIn((r, c), {(0, 1), (1, 0), (1, 1)})
+
+    def test_estimate_mine_probabilities(self):
+        board_state = minesweeper.init_board_state(3)
+        board_state[0][0] = 1
+        exact_component_size = heuristic_model.exact_component_size
+        heuristic_model.exact_component_size = 0
+        try:
+            actual_val, errors = heuristic_model.estimate_mine_probabilities(
+                board_state,
+                2,
+                deadline=time.perf_counter() + 0.02,
+                rng=np.random.default_rng(0),
+            )
+        finally:
+            heuristic_model.exact_component_size = exact_component_size
+        expected_val = heuristic_model.mine_probabilities(board_state, 2)
+        frontier = [(0, 1), (1, 0), (1, 1)]
+        for r, c in frontier:
+            self.assertAlmostEqual(actual_val[r][c], expected_val[r][c], delta=0.1)
+            self.assertGreater(errors[r][c], 0)
+        self.assertAlmostEqual(actual_val[2][2], 1 / 5)
+
+    def test_estimate_mine_probabilities_draws(self):
+        board_state = minesweeper.init_board_state(3)
+        board_state[0][0] = 1
+        exact_component_size = heuristic_model.exact_component_size
+        heuristic_model.exact_component_size = 0
+        try:
+            estimates = []
+            next_draws = []
+            for deadline, draws in ((None, 50), (None, 50), (0.01, None)):
+                rng = np.random.default_rng(0)
+                if deadline is not None:
+                    deadline += time.perf_counter()
+                estimates.append(
+                    heuristic_model.estimate_mine_probabilities(
+                        board_state, 2, deadline=deadline, rng=rng, draws=draws
+                    )[0]
+                )
+                next_draws.append(rng.integers(2**63))
+        finally:
+            heuristic_model.exact_component_size = exact_component_size
+        self.assertTrue(np.array_equal(estimates[0], estimates[1], equal_nan=True))
+        # the game's own generator moves on the same whatever the number of draws
+        self.assertEqual(len(set(next_draws)), 1)
+
+
+# This test case checks that the local probability guess avoids the frontier when the
+# tiles off it are safer, and never guesses a tile a number marks as a certain mine.
+class TestLocalProbability(unittest.TestCase):
+    def test_select_tile_with_lowest_local_probability(self):
+        board_state = minesweeper.init_board_state(3)
+        board_state[0][0] = 1
+        rng = np.random.default_rng(0)
+        for _ in range(10):
+            r, c = heuristic_model.select_tile_with_lowest_local_probability(
+                board_state, 2, rng
+            )
+            self.assertNotIn((r, c), {(0, 0), (0, 1), (1, 0), (1, 1)})
+
+    def test_select_tile_with_lowest_local_probability_certain_mine(self):
+        board_state = np.array([[-1, 1, 0, -1], [1, 1, 0, -1], [0, 0, 0, -1]])
+        rng = np.random.default_rng(0)
+        for _ in range(10):
+            r, c = heuristic_model.select_tile_with_lowest_local_probability(
+                board_state, 2, rng
+            )
+            self.assertNotEqual((r, c), (0, 0))
+
+
+# This test case checks that games interleaved on solvers of their own play the same
+# moves as the games played one after the other through ai_heuristic_logic, and that
+# the tiered model counts every move it finds under one of its tiers.
+class TestHeuristicSolver(unittest.TestCase):
+    def play(self, game, solver, rng):
+        if solver is None:
+            return ai_heuristic_logic(game.board_state, game.first_move, 40, 1, 1, rng)
+        return solver.ai_heuristic_logic(
+            game.board_state, game.first_move, 40, 1, 1, rng
+        )
+
+    def apply(self, game, opp, r, c):
+        if opp == "open":
+            game.open(r, c)
+        if opp == "flag":
+            game.flag(r, c)
+
+    def test_interleaved_games(self):
+        expected_val = []
+        for seed in range(2):
+            game = minesweeper.Game(16, 40, rng=seed)
+            rng = np.random.default_rng(seed)
+            moves = []
+            while not game.won() and not game.lost():
+                opp, r, c = self.play(game, None, rng)
+                moves.append((opp, int(r), int(c)))
+                self.apply(game, opp, r, c)
+            expected_val.append(moves)
+
+        games = [minesweeper.Game(16, 40, rng=seed) for seed in range(2)]
+        rngs = [np.random.default_rng(seed) for seed in range(2)]
+        solvers = [heuristic_model.HeuristicSolver() for seed in range(2)]
+        actual_val = [[], []]
+        while any(not game.won() and not game.lost() for game in games):
+            for i, game in enumerate(games):
+                if game.won() or game.lost():
+                    continue
+                opp, r, c = self.play(game, solvers[i], rngs[i])
+                actual_val[i].append((opp, int(r), int(c)))
+                self.apply(game, opp, r, c)
+        self.assertEqual(actual_val, expected_val)
+
+    def test_tier_stats(self):
+        solver = heuristic_model.HeuristicSolver()
+        game = minesweeper.Game(16, 40, rng=3)
+        rng = np.random.default_rng(3)
+        move_count = 0
+        while not game.won() and not game.lost():
+            opp, r, c = solver.ai_heuristic_logic(
+                game.board_state, game.first_move, 40, 2, 1, rng
+            )
+            self.apply(game, opp, r, c)
+            move_count += 1
+        tiers = {"SP", "pattern", "CSP", "endgame", "guess"}
+        self.assertLessEqual(set(solver.tier_stats), tiers)
+        actual_val = sum(moves for moves, seconds in solver.tier_stats.values())
+        self.assertEqual(actual_val, move_count + len(solver.queue))
+        self.assertGreater(solver.tier_stats["SP"][0], 0)
+        self.assertNotIn("pattern", solver.tier_stats)
+
+
+# This test case checks that the endgame solver finds the moves only the number of mines
+# left settles, and that the solver runs it as a tier only in the endgame.
+class TestEndgameSolver(unittest.TestCase):
+    def test_endgame_solver_open(self):
+        # the 1 holds the only mine, so the tile no constraint reaches is empty
+        board_state = [[-1, 1, -1, -1]]
+        solver = heuristic_model.HeuristicSolver()
+        heuristic_model.CSP_solver(board_state, None, solver)
+        self.assertEqual(list(solver.queue), [])
+        heuristic_model.endgame_solver(board_state, 1, None, solver)
+        self.assertEqual(list(solver.queue), [("open", 0, 3)])
+
+    def test_endgame_solver_flag(self):
+        board_state = [[-1, 1, -1, -1]]
+        solver = heuristic_model.HeuristicSolver()
+        heuristic_model.endgame_solver(board_state, 2, None, solver)
+        self.assertEqual(list(solver.queue), [("flag", 0, 3)])
+
+    def test_endgame_tier(self):
+        board_state = np.array([[-1, 1, -1, -1]])
+        solver = heuristic_model.HeuristicSolver()
+        actual_val = solver.ai_heuristic_moves(board_state, False, 1, 1, 1)
+        self.assertEqual(actual_val, [("open", 0, 3)])
+        self.assertEqual(solver.tier_stats["endgame"][0], 1)
+
+        # outside the endgame the mine count is not used
+        threshold = heuristic_model.endgame_threshold
+        heuristic_model.endgame_threshold = 2
+        try:
+            solver = heuristic_model.HeuristicSolver()
+            actual_val = solver.ai_heuristic_moves(board_state, False, 1, 1, 0)
+            self.assertNotIn("endgame", solver.tier_stats)
+            self.assertEqual(len(actual_val), 1)
+        finally:
+            heuristic_model.endgame_threshold = threshold
+
+
 if __name__ == "__main__":
     unittest.main()